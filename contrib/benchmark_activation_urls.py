@@ -0,0 +1,58 @@
+"""
+Compare generating activation URL's with reverse() to generating them with
+the URL templates used for subscriptions::
+
+    DJANGO_SETTINGS_MODULE=mysite.settings \\
+        python contrib/benchmark_activation_urls.py --number 100000
+"""
+
+import argparse
+import timeit
+
+import django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    django.setup()
+
+    from django.core.urlresolvers import reverse
+
+    from newsletter.models import ACTIVATE_URLS
+
+    kwargs = {
+        'newsletter_slug': 'test-newsletter',
+        'email': 'test.name+tag@example.com',
+        'activation_code': '0123456789abcdef0123456789abcdef01234567'
+    }
+
+    url_template = ACTIVATE_URLS['subscribe']
+
+    assert url_template(**kwargs) == reverse(
+        'newsletter_update_activate', kwargs=dict(kwargs, action='subscribe')
+    )
+
+    candidates = (
+        ('reverse()', lambda: reverse(
+            'newsletter_update_activate',
+            kwargs=dict(kwargs, action='subscribe')
+        )),
+        ('URLTemplate', lambda: url_template(**kwargs)),
+    )
+
+    for description, func in candidates:
+        timing = min(timeit.repeat(
+            func, number=args.number, repeat=args.repeat
+        ))
+
+        print('%-12s %.2f us per URL' % (
+            description, timing / args.number * 1000000
+        ))
+
+
+if __name__ == '__main__':
+    main()
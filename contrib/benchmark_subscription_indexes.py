@@ -0,0 +1,131 @@
+"""
+Show query plans of the common subscription queries before and after the
+composite subscription indexes (migration 0005) are applied.
+
+Run this against a scratch database only, as it seeds it with subscriptions
+and migrates the newsletter app back and forth::
+
+    DJANGO_SETTINGS_MODULE=mysite.settings \\
+        python contrib/benchmark_subscription_indexes.py --rows 1000000
+"""
+
+import argparse
+import timeit
+
+import django
+
+
+SEED_BATCH_SIZE = 10000
+
+
+def seed(rows, newsletters=10):
+    from django.db import transaction
+
+    from newsletter.models import Newsletter, Subscription
+
+    Subscription.objects.all().delete()
+    Newsletter.objects.filter(slug__startswith='benchmark-').delete()
+
+    newsletter_ids = [
+        Newsletter.objects.create(
+            title='Benchmark %d' % n, slug='benchmark-%d' % n,
+            email='benchmark@example.com', sender='Benchmark'
+        ).pk
+        for n in range(newsletters)
+    ]
+
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        with transaction.atomic():
+            Subscription.objects.bulk_create([
+                Subscription(
+                    newsletter_id=newsletter_ids[n % newsletters],
+                    email_field='user%d@example.com' % n,
+                    name_field='User %d' % n,
+                    # Roughly a quarter of all subscriptions is inactive
+                    subscribed=n % 4 != 0,
+                    unsubscribed=n % 4 == 0,
+                )
+                for n in range(start, min(start + SEED_BATCH_SIZE, rows))
+            ])
+
+    return Newsletter.objects.get(pk=newsletter_ids[0])
+
+
+def get_queries(newsletter):
+    from newsletter.models import Subscription
+
+    subscriptions = Subscription.objects.filter(newsletter=newsletter)
+    middle = subscriptions.order_by('pk')[subscriptions.count() // 2]
+
+    return (
+        ('active subscriptions', newsletter.get_subscriptions()),
+        ('active subscriptions page',
+            newsletter.get_subscriptions().filter(
+                pk__gt=middle.pk).order_by('pk')[:1000]),
+        ('subscription by e-mail',
+            subscriptions.filter(email_field__exact=middle.email_field)),
+        ('subscription by user', subscriptions.filter(user=None)[:1]),
+    )
+
+
+def explain(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.get_compiler(connection.alias).as_sql()
+
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    else:
+        prefix = 'EXPLAIN'
+
+    with connection.cursor() as cursor:
+        cursor.execute('%s %s' % (prefix, sql), params)
+        return [' '.join(str(c) for c in row) for row in cursor.fetchall()]
+
+
+def report(title, queries, repeat):
+    from django.db import connection
+
+    # Make sure the planner has up to date statistics
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    print('== %s ==' % title)
+
+    for description, queryset in queries:
+        timing = min(timeit.repeat(
+            lambda: list(queryset.all()), number=1, repeat=repeat
+        ))
+
+        print('\n%s (%.2f ms)' % (description, timing * 1000))
+        for line in explain(queryset):
+            print('    %s' % line)
+
+    print('')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', 'newsletter', '0004', verbosity=0)
+
+    newsletter = seed(args.rows)
+    queries = get_queries(newsletter)
+
+    report('Before (0004)', queries, args.repeat)
+
+    call_command('migrate', 'newsletter', '0005', verbosity=0)
+
+    report('After (0005)', queries, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
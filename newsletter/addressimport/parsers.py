@@ -1,23 +1,74 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import codecs
 import io
+import json
+
+from collections import Counter, defaultdict
+
+import six
 
 from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext as _, ugettext_lazy
 
 from newsletter.models import Subscription
+from newsletter.validators import get_user_emails
+
+
+# Kinds of errors for which entries are skipped, with their description
+IMPORT_ERRORS = (
+    ('invalid', ugettext_lazy("Invalid e-mail address")),
+    ('duplicate', ugettext_lazy("Duplicate entry")),
+    ('subscribed', ugettext_lazy("Already subscribed")),
+    ('user', ugettext_lazy("Belongs to a user account")),
+    ('incomplete', ugettext_lazy("Missing e-mail address")),
+    ('malformed', ugettext_lazy("Malformed entry")),
+)
+
+
+class AddressList(dict):
+    """
+    Mapping of unique addresses to names.
 
+    Entries which cannot be added are counted per kind of error, keeping
+    a few of them as samples for reporting.
 
-class AddressList(object):
-    """ List with unique addresses. """
+    Checking addresses against existing subscriptions and users is done
+    for batches of added entries; entries remain pending until the batch
+    is flushed.
+
+    The encoding the entries were read with, if any, is kept for reporting.
+    """
+
+    # Number of offending entries kept (and logged) per kind of error
+    max_samples = 5
+
+    # Number of pending entries checked against the database at once
+    batch_size = 500
+
+    def __init__(self, newsletter, ignore_errors=False, encoding=None):
+        super(AddressList, self).__init__()
 
-    def __init__(self, newsletter, ignore_errors=False):
         self.newsletter = newsletter
         self.ignore_errors = ignore_errors
-        self.addresses = {}
+        self.encoding = encoding
+
+        self.errors = Counter()
+        self.samples = defaultdict(list)
+
+        # Entries added since the last flush, as (email, location)
+        self.pending = []
+        self.pending_emails = set()
+
+    @property
+    def addresses(self):
+        """ The list itself maps addresses into names. """
+        self.flush()
+
+        return self
 
     def add(self, email, name=None, location='unknown location'):
         """ Add name to list. """
@@ -30,60 +81,135 @@ class AddressList(object):
         try:
             validate_email(email)
         except ValidationError:
-            logger.warning(
-                "Entry '%s' does not contain a valid e-mail address at %s."
-                % (email, location)
+            self.skip('invalid', email, location, _(
+                "Entry '%s' does not contain a valid "
+                "e-mail address.") % name
             )
 
-            if not self.ignore_errors:
-                raise forms.ValidationError(_(
-                    "Entry '%s' does not contain a valid "
-                    "e-mail address.") % name
-                )
-
             # Skip this entry
             return
 
-        if email in self.addresses:
-            logger.warning(
-                "Entry '%s' contains a duplicate entry at %s."
-                % (email, location)
+        if email in self and email not in self.pending_emails:
+            self.skip('duplicate', email, location, _(
+                "The address file contains duplicate entries "
+                "for '%s'.") % email
             )
 
-            if not self.ignore_errors:
-                raise forms.ValidationError(_(
-                    "The address file contains duplicate entries "
-                    "for '%s'.") % email)
-
             # Skip this entry
             return
 
-        if subscription_exists(self.newsletter, email, name):
-            logger.warning(
-                "Entry '%s' is already subscribed to at %s."
-                % (email, location)
-            )
+        # Duplicates of pending entries are only known to be duplicates,
+        # rather than subscribed to, after flushing.
+        self.setdefault(email, name)
+        self.pending.append((email, location))
+        self.pending_emails.add(email)
 
-            if not self.ignore_errors:
-                raise forms.ValidationError(
-                    _("Some entries are already subscribed to."))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
 
-            # Skip this entry
+    def flush(self):
+        """
+        Remove pending entries which are already subscribed to or which
+        belong to a user, in a single query for either.
+        """
+
+        if not self.pending:
             return
 
-        self.addresses[email] = name
+        pending, self.pending = self.pending, []
+        emails, self.pending_emails = self.pending_emails, set()
+
+        subscribed = get_subscribed_emails(self.newsletter, emails)
+        user_emails = get_user_emails(emails)
+
+        seen = set()
+
+        for email, location in pending:
+            if email in subscribed:
+                self.pop(email, None)
+
+                self.skip('subscribed', email, location, _(
+                    "Some entries are already subscribed to.")
+                )
+
+            elif email in user_emails:
+                self.pop(email, None)
+
+                self.skip('user', email, location, _(
+                    "The e-mail address '%s' belongs to a user with an "
+                    "account on this site.") % email
+                )
+
+            elif email in seen:
+                self.skip('duplicate', email, location, _(
+                    "The address file contains duplicate entries "
+                    "for '%s'.") % email
+                )
+
+            seen.add(email)
+
+    def skip(self, error, entry, location, message):
+        """
+        Register `entry` as skipped because of `error`. Unless errors are
+        ignored, a ValidationError with `message` is raised.
+        """
+
+        self.errors[error] += 1
+
+        samples = self.samples[error]
+        if len(samples) < self.max_samples:
+            samples.append((entry, location))
+            log = logger.warning
+        else:
+            # Don't flood the logs with entries of large, dirty files
+            log = logger.debug
+
+        log("Skipping entry '%s' at %s: %s", entry, location, error)
+
+        if not self.ignore_errors:
+            raise forms.ValidationError(message)
+
+    def get_report(self):
+        """
+        Return a report on the entries in the list, with the number of
+        skipped entries and sample entries for every kind of error.
+        """
+
+        self.flush()
+
+        return {
+            'encoding': self.encoding,
+            'valid': len(self),
+            'skipped': sum(self.errors.values()),
+            'errors': [
+                {
+                    'description': description,
+                    'count': self.errors[error],
+                    'samples': self.samples[error]
+                }
+                for error, description in IMPORT_ERRORS if self.errors[error]
+            ]
+        }
 
 
 def subscription_exists(newsletter, email, name=None):
     """
     Return wheter or not a subscription exists.
     """
+    return bool(get_subscribed_emails(newsletter, [email]))
+
+
+def get_subscribed_emails(newsletter, emails):
+    """
+    Return the set of e-mail addresses in `emails` with an active
+    subscription to `newsletter`.
+    """
     qs = Subscription.objects.filter(
         newsletter__id=newsletter.id,
         subscribed=True,
-        email_field__exact=email)
+        email_field__in=emails)
 
-    return qs.exists()
+    return set(qs.values_list('email_field', flat=True))
 
 
 def check_email(email, ignore_errors=False):
@@ -141,38 +267,64 @@ def check_name(name, ignore_errors=False):
         )
 
 
-def get_encoding(myfile):
-    """ Returns encoding of file, rewinding the file after detection. """
+# Number of bytes inspected when detecting the encoding of a file
+ENCODING_SAMPLE_SIZE = 64 * 1024
 
-    # Detect encoding
-    from chardet.universaldetector import UniversalDetector
+# Byte order marks, longest first as the UTF-32 marks start with UTF-16 ones
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
 
-    detector = UniversalDetector()
 
-    for line in myfile.readlines():
-        detector.feed(line)
-        if detector.done:
-            break
+def get_encoding(myfile, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    Returns encoding of file, rewinding the file after detection.
+
+    Only the first `sample_size` bytes are inspected. Byte order marks and
+    (the overwhelmingly common) UTF-8 are recognized directly, chardet is only
+    consulted on the sample if neither applies.
+    """
 
-    detector.close()
-    encoding = detector.result['encoding']
+    sample = myfile.read(sample_size)
 
     # Reset the file index
     myfile.seek(0)
 
-    return encoding
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # The sample might end halfway a multibyte character
+        if (len(sample) == sample_size and e.end == len(sample) and
+                e.reason == 'unexpected end of data'):
+            return 'utf-8'
+
+    import chardet
+
+    return chardet.detect(sample)['encoding']
 
 
-def parse_csv(myfile, newsletter, ignore_errors=False):
+def parse_csv(myfile, newsletter, ignore_errors=False, encoding=None):
     """
     Parse addresses from CSV file-object into newsletter.
 
+    The encoding of the file is detected, unless explicitly specified.
+
     Returns a dictionary mapping email addresses into Subscription objects.
     """
 
     import unicodecsv
 
-    encoding = get_encoding(myfile)
+    if not encoding:
+        encoding = get_encoding(myfile)
 
     # Attempt to detect the dialect
     # Ref: https://bugs.python.org/issue5332
@@ -247,23 +399,18 @@ def parse_csv(myfile, newsletter, ignore_errors=False):
 
     logger.debug('Extracting data.')
 
-    address_list = AddressList(newsletter, ignore_errors)
+    address_list = AddressList(newsletter, ignore_errors, encoding)
 
     for row in myreader:
         if not max(namecol, mailcol) < len(row):
-            logger.warning(
-                "Column count does not match for row number %d",
-                myreader.line_num, extra=dict(data={'row': row})
-            )
-
-            if ignore_errors:
-                # Skip this record
-                continue
-            else:
-                raise forms.ValidationError(_(
+            address_list.skip(
+                'incomplete', row, "line %d" % myreader.line_num, _(
                     "Row with content '%(row)s' does not contain a name and "
                     "email field.") % {'row': row}
-                )
+            )
+
+            # Skip this record
+            continue
 
         address_list.add(
             row[mailcol], row[namecol], location="line %d" % myreader.line_num
@@ -272,15 +419,18 @@ def parse_csv(myfile, newsletter, ignore_errors=False):
     return address_list.addresses
 
 
-def parse_vcard(myfile, newsletter, ignore_errors=False):
+def parse_vcard(myfile, newsletter, ignore_errors=False, encoding=None):
     """
     Parse addresses from vCard file-object into newsletter.
 
+    The encoding of the file is detected, unless explicitly specified.
+
     Returns a dictionary mapping email addresses into Subscription objects.
     """
     import card_me
 
-    encoding = get_encoding(myfile)
+    if not encoding:
+        encoding = get_encoding(myfile)
     encodedfile = io.TextIOWrapper(myfile, encoding=encoding)
 
     try:
@@ -290,7 +440,7 @@ def parse_vcard(myfile, newsletter, ignore_errors=False):
             _(u"Error reading vCard file: %s" % e)
         )
 
-    address_list = AddressList(newsletter, ignore_errors)
+    address_list = AddressList(newsletter, ignore_errors, encoding)
 
     for myvcard in myvcards:
         if hasattr(myvcard, 'fn'):
@@ -304,10 +454,12 @@ def parse_vcard(myfile, newsletter, ignore_errors=False):
         # If not: either continue to the next vcard or raise validation error.
         if hasattr(myvcard, 'email'):
             email = myvcard.email.value
-        elif not ignore_errors:
-            raise forms.ValidationError(
-                _("Entry '%s' contains no email address.") % name)
         else:
+            address_list.skip(
+                'incomplete', name, 'unknown location',
+                _("Entry '%s' contains no email address.") % name
+            )
+
             continue
 
         address_list.add(email, name)
@@ -340,12 +492,79 @@ def parse_ldif(myfile, newsletter, ignore_errors=False):
 
                 address_list.add(email, name)
 
-            elif not ignore_errors:
-                raise forms.ValidationError(
-                    _("Some entries have no e-mail address."))
+            else:
+                address_list.skip(
+                    'incomplete', dn, 'unknown location',
+                    _("Some entries have no e-mail address.")
+                )
 
     except ValueError as e:
-        if not ignore_errors:
-            raise forms.ValidationError(e)
+        address_list.skip('malformed', e, 'unknown location', e)
+
+    return address_list.addresses
+
+
+def parse_jsonl(myfile, newsletter, ignore_errors=False, encoding=None):
+    """
+    Parse addresses from JSON Lines file-object into newsletter.
+
+    Every line should contain an object with an 'email' (or 'e-mail') and,
+    optionally, a 'name' member. The file is read line by line, so it is
+    never completely held in memory.
+
+    Returns a dictionary mapping email addresses into Subscription objects.
+    """
+
+    # Like UTF-8, but skipping a byte order mark
+    encoding = encoding or 'utf-8-sig'
+    encodedfile = io.TextIOWrapper(myfile, encoding=encoding)
+
+    address_list = AddressList(newsletter, ignore_errors, encoding)
+
+    for line_num, line in enumerate(encodedfile, 1):
+        line = line.strip()
+
+        # Skip empty lines
+        if not line:
+            continue
+
+        try:
+            entry = json.loads(line)
+
+            if not isinstance(entry, dict):
+                raise ValueError('Not a JSON object.')
+
+        except ValueError:
+            address_list.skip(
+                'malformed', line, "line %d" % line_num, _(
+                    "Line %d does not contain a valid JSON object."
+                ) % line_num
+            )
+
+            continue
+
+        email = entry.get('email', entry.get('e-mail'))
+        name = entry.get('name') or ''
+
+        if not email:
+            address_list.skip(
+                'incomplete', line, "line %d" % line_num,
+                _("Some entries have no e-mail address.")
+            )
+
+            continue
+
+        if not isinstance(email, six.string_types) or \
+                not isinstance(name, six.string_types):
+            address_list.skip(
+                'malformed', line, "line %d" % line_num, _(
+                    "Line %d has an e-mail address or name which is not "
+                    "a string."
+                ) % line_num
+            )
+
+            continue
+
+        address_list.add(email, name, location="line %d" % line_num)
 
     return address_list.addresses
@@ -3,19 +3,19 @@ logger = logging.getLogger(__name__)
 
 import six
 
-from django.db import models
+from django.db import models, transaction
 
 from django.conf import settings
 from django.conf.urls import url
 
 from django.contrib import admin, messages
-from django.contrib.sites.models import Site
 
-from django.core import serializers
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import (
+    HttpResponse, HttpResponseRedirect, Http404, StreamingHttpResponse
+)
 
 from django.template import Context
 
@@ -30,7 +30,7 @@ from django.views.i18n import javascript_catalog
 from sorl.thumbnail.admin import AdminImageMixin
 
 from .models import (
-    Newsletter, Subscription, Article, Message, Submission
+    Newsletter, Subscription, Article, Message, Submission, Suppression
 )
 
 from django.utils.timezone import now
@@ -40,6 +40,8 @@ from .admin_forms import (
     ArticleFormSet
 )
 from .admin_utils import ExtendibleModelAdminMixin, make_subscription
+from .export import EXPORT_FORMATS, export_subscriptions
+from .utils import make_activation_codes
 
 from .settings import newsletter_settings
 
@@ -51,10 +53,14 @@ ICON_URLS = {
     'no': '%snewsletter/admin/img/icon-no.gif' % settings.STATIC_URL
 }
 
+# Number of imported subscriptions inserted per query
+IMPORT_BATCH_SIZE = 500
+
 
 class NewsletterAdmin(admin.ModelAdmin):
     list_display = (
-        'title', 'admin_subscriptions', 'admin_messages', 'admin_submissions'
+        'title', 'subscribed_count', 'unsubscribed_count', 'unactivated_count',
+        'admin_subscriptions', 'admin_messages', 'admin_submissions'
     )
     prepopulated_fields = {'slug': ('title',)}
 
@@ -87,10 +93,13 @@ class SubmissionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
         'admin_message', 'admin_newsletter', 'admin_publish_date', 'publish',
         'admin_status_text', 'admin_status'
     )
+    list_select_related = ('message', 'newsletter')
     date_hierarchy = 'publish_date'
     list_filter = ('newsletter', 'publish', 'sent')
     save_as = True
-    filter_horizontal = ('subscriptions',)
+    # Selected recipients are looked up in the (paginated and searchable)
+    # subscription list, as rendering all of them as options doesn't scale.
+    raw_id_fields = ('subscriptions',)
 
     """ List extensions """
     def admin_message(self, obj):
@@ -100,7 +109,7 @@ class SubmissionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
 
     def admin_newsletter(self, obj):
         return '<a href="../newsletter/%s/">%s</a>' % (
-            obj.newsletter.id, obj.newsletter
+            obj.newsletter_id, obj.newsletter
         )
     admin_newsletter.short_description = _('newsletter')
     admin_newsletter.allow_tags = True
@@ -225,6 +234,7 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
         'admin_title', 'admin_newsletter', 'admin_preview', 'date_create',
         'date_modify'
     )
+    list_select_related = ('newsletter', )
     list_filter = ('newsletter', )
     date_hierarchy = 'date_create'
     prepopulated_fields = {'slug': ('title',)}
@@ -244,11 +254,22 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
 
     def admin_newsletter(self, obj):
         return '<a href="../newsletter/%s/">%s</a>' % (
-            obj.newsletter.id, obj.newsletter
+            obj.newsletter_id, obj.newsletter
         )
     admin_newsletter.short_description = _('newsletter')
     admin_newsletter.allow_tags = True
 
+    def get_preview_context(self, message):
+        """ Return the context for rendering previews of `message`. """
+        context = message.newsletter.get_message_context()
+
+        context.update({
+            'message': message,
+            'date': now(),
+        })
+
+        return context
+
     """ Views """
     def preview(self, request, object_id):
         return render(
@@ -267,12 +288,7 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
                 'message belongs to.'
             ))
 
-        c = Context({'message': message,
-                     'site': Site.objects.get_current(),
-                     'newsletter': message.newsletter,
-                     'date': now(),
-                     'STATIC_URL': settings.STATIC_URL,
-                     'MEDIA_URL': settings.MEDIA_URL})
+        c = Context(self.get_preview_context(message))
 
         return HttpResponse(message.html_template.render(c))
 
@@ -280,14 +296,7 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
     def preview_text(self, request, object_id):
         message = self._getobj(request, object_id)
 
-        c = Context({
-            'message': message,
-            'site': Site.objects.get_current(),
-            'newsletter': message.newsletter,
-            'date': now(),
-            'STATIC_URL': settings.STATIC_URL,
-            'MEDIA_URL': settings.MEDIA_URL
-        }, autoescape=False)
+        c = Context(self.get_preview_context(message), autoescape=False)
 
         return HttpResponse(
             message.text_template.render(c),
@@ -302,14 +311,6 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
 
         return HttpResponseRedirect(change_url)
 
-    def subscribers_json(self, request, object_id):
-        message = self._getobj(request, object_id)
-
-        json = serializers.serialize(
-            "json", message.newsletter.get_subscriptions(), fields=()
-        )
-        return HttpResponse(json, content_type='application/json')
-
     """ URLs """
     def get_urls(self):
         urls = super(MessageAdmin, self).get_urls()
@@ -327,9 +328,6 @@ class MessageAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
             url(r'^(.+)/submit/$',
                 self._wrap(self.submit),
                 name=self._view_name('submit')),
-            url(r'^(.+)/subscribers/json/$',
-                self._wrap(self.subscribers_json),
-                name=self._view_name('subscribers_json')),
         ]
 
         return my_urls + urls
@@ -342,6 +340,7 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
         'admin_unsubscribe_date', 'admin_status_text', 'admin_status'
     )
     list_display_links = ('name', 'email')
+    list_select_related = ('newsletter', 'user')
     list_filter = (
         'newsletter', 'subscribed', 'unsubscribed', 'subscribe_date'
     )
@@ -359,7 +358,7 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
     """ List extensions """
     def admin_newsletter(self, obj):
         return '<a href="../newsletter/%s/">%s</a>' % (
-            obj.newsletter.id, obj.newsletter
+            obj.newsletter_id, obj.newsletter
         )
     admin_newsletter.short_description = _('newsletter')
     admin_newsletter.allow_tags = True
@@ -403,8 +402,25 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
     admin_unsubscribe_date.short_description = _("unsubscribe date")
 
     """ Actions """
+    def bulk_update(self, queryset, **kwargs):
+        """
+        Update subscriptions in queryset, recalculating the subscription
+        counters of their newsletters as bulk updates bypass their
+        maintenance.
+        """
+        newsletter_ids = set(
+            queryset.order_by().values_list('newsletter', flat=True)
+        )
+
+        rows_updated = queryset.update(**kwargs)
+
+        for newsletter in Newsletter.objects.filter(pk__in=newsletter_ids):
+            newsletter.update_subscription_counts()
+
+        return rows_updated
+
     def make_subscribed(self, request, queryset):
-        rows_updated = queryset.update(subscribed=True)
+        rows_updated = self.bulk_update(queryset, subscribed=True)
         self.message_user(
             request,
             ungettext(
@@ -416,7 +432,7 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
     make_subscribed.short_description = _("Subscribe selected users")
 
     def make_unsubscribed(self, request, queryset):
-        rows_updated = queryset.update(subscribed=False)
+        rows_updated = self.bulk_update(queryset, subscribed=False)
         self.message_user(
             request,
             ungettext(
@@ -433,10 +449,18 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
             raise PermissionDenied()
         if request.POST:
             form = ImportForm(request.POST, request.FILES)
-            if form.is_valid():
+            if form.is_valid() and form.cleaned_data['dry_run']:
+                return render(
+                    request,
+                    "admin/newsletter/subscription/importform.html",
+                    {'form': form, 'report': form.get_report()},
+                )
+
+            elif form.is_valid():
                 request.session['addresses'] = form.get_addresses()
                 request.session['newsletter_pk'] = \
                     form.cleaned_data['newsletter'].pk
+                request.session['encoding'] = form.get_encoding()
 
                 confirm_url = reverse(
                     'admin:newsletter_subscription_import_confirm'
@@ -451,6 +475,35 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
             {'form': form},
         )
 
+    def create_subscriptions(self, newsletter, addresses):
+        """
+        Create active subscriptions to `newsletter` for `addresses`, a
+        dictionary mapping email addresses into names, in bulk.
+        """
+        subscribe_date = now()
+        activation_codes = make_activation_codes(len(addresses))
+
+        subscriptions = [
+            make_subscription(
+                newsletter, email, name, activation_code=activation_code,
+                subscribe_date=subscribe_date
+            )
+            for (email, name), activation_code in zip(
+                six.iteritems(addresses), activation_codes
+            )
+        ]
+
+        with transaction.atomic():
+            Subscription.objects.bulk_create(
+                subscriptions, batch_size=IMPORT_BATCH_SIZE
+            )
+
+            # bulk_create() bypasses save(), so update the counters here
+            Newsletter.objects.filter(pk=newsletter.pk).update(
+                subscribed_count=models.F('subscribed_count') +
+                len(subscriptions)
+            )
+
     def subscribers_import_confirm(self, request):
         # If no addresses are in the session, start all over.
 
@@ -469,14 +522,11 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
             form = ConfirmForm(request.POST)
             if form.is_valid():
                 try:
-                    for email, name in six.iteritems(addresses):
-                        address_inst = make_subscription(
-                            newsletter, email, name
-                        )
-                        address_inst.save()
+                    self.create_subscriptions(newsletter, addresses)
                 finally:
                     del request.session['addresses']
                     del request.session['newsletter_pk']
+                    request.session.pop('encoding', None)
 
                 messages.success(
                     request,
@@ -497,8 +547,51 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
         return render(
             request,
             "admin/newsletter/subscription/confirmimportform.html",
-            {'form': form, 'subscribers': addresses},
+            {
+                'form': form, 'subscribers': addresses,
+                'encoding': request.session.get('encoding')
+            },
+        )
+
+    def subscribers_export(self, request):
+        """
+        Stream subscriptions as CSV or JSON Lines. By default only active
+        subscriptions are exported, optionally limited to a newsletter.
+        """
+        if not request.user.has_perm('newsletter.change_subscription'):
+            raise PermissionDenied()
+
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise Http404(_('Unknown export format.'))
+
+        queryset = Subscription.objects.all()
+
+        newsletter_pk = request.GET.get('newsletter')
+        if newsletter_pk:
+            try:
+                newsletter_pk = int(newsletter_pk)
+            except ValueError:
+                raise Http404(_('Unknown newsletter.'))
+
+            queryset = queryset.filter(newsletter__pk=newsletter_pk)
+
+        if not request.GET.get('all'):
+            queryset = queryset.filter(subscribed=True)
+
+        if export_format == 'jsonl':
+            content_type = 'application/x-ndjson; charset=utf-8'
+        else:
+            content_type = 'text/csv; charset=utf-8'
+
+        response = StreamingHttpResponse(
+            export_subscriptions(queryset, export_format),
+            content_type=content_type
         )
+        response['Content-Disposition'] = \
+            'attachment; filename="subscribers.%s"' % export_format
+
+        return response
 
     """ URLs """
     def get_urls(self):
@@ -511,6 +604,9 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
             url(r'^import/confirm/$',
                 self._wrap(self.subscribers_import_confirm),
                 name=self._view_name('import_confirm')),
+            url(r'^export/$',
+                self._wrap(self.subscribers_export),
+                name=self._view_name('export')),
 
             # Translated JS strings - these should be app-wide but are
             # only used in this part of the admin. For now, leave them here.
@@ -523,7 +619,15 @@ class SubscriptionAdmin(admin.ModelAdmin, ExtendibleModelAdminMixin):
         return my_urls + urls
 
 
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('email', 'reason', 'create_date')
+    list_filter = ('reason', 'create_date')
+    search_fields = ('email',)
+    date_hierarchy = 'create_date'
+
+
 admin.site.register(Newsletter, NewsletterAdmin)
 admin.site.register(Submission, SubmissionAdmin)
 admin.site.register(Message, MessageAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
+admin.site.register(Suppression, SuppressionAdmin)
@@ -1,3 +1,6 @@
+import codecs
+import gzip
+import io
 import logging
 
 from django import forms
@@ -7,7 +10,9 @@ from django.contrib.admin import widgets, options
 from django.utils.translation import ugettext as _
 
 from .models import Subscription, Newsletter, Submission
-from .addressimport.parsers import parse_csv, parse_vcard, parse_ldif
+from .addressimport.parsers import (
+    parse_csv, parse_vcard, parse_ldif, parse_jsonl
+)
 
 
 logger = logging.getLogger(__name__)
@@ -24,8 +29,11 @@ class ImportForm(forms.Form):
             # TESTME: Should an error be raised here or not?
             # raise forms.ValidationError(_("No file has been specified."))
 
-        ignore_errors = self.cleaned_data['ignore_errors']
+        dry_run = self.cleaned_data.get('dry_run')
+        # A dry run reports on all errors instead of stopping at the first
+        ignore_errors = self.cleaned_data['ignore_errors'] or dry_run
         newsletter = self.cleaned_data['newsletter']
+        encoding = self.cleaned_data.get('encoding')
 
         myfield = self.base_fields['address_file']
         myvalue = myfield.widget.value_from_datadict(
@@ -37,36 +45,89 @@ class ImportForm(forms.Form):
                          'application/vnd.ms-excel',
                          'text/comma-separated-values', 'text/csv',
                          'application/csv', 'application/excel',
-                         'application/vnd.msexcel', 'text/anytext')
+                         'application/vnd.msexcel', 'text/anytext',
+                         'application/json', 'application/x-ndjson',
+                         'application/jsonlines', 'application/x-jsonlines',
+                         'application/gzip', 'application/x-gzip')
         if content_type not in allowed_types:
             raise forms.ValidationError(_(
                 "File type '%s' was not recognized.") % content_type)
 
-        ext = myvalue.name.rsplit('.', 1)[-1].lower()
-        if ext == 'vcf':
-            self.addresses = parse_vcard(
-                myvalue.file, newsletter, ignore_errors)
+        myfile = myvalue.file
+        filename = myvalue.name.lower()
 
-        elif ext == 'ldif':
-            self.addresses = parse_ldif(
-                myvalue.file, newsletter, ignore_errors)
+        # Compressed files are decompressed on the fly while parsing
+        compressed = filename.endswith('.gz')
+        if compressed:
+            filename = filename[:-len('.gz')]
+            # GzipFile lacks read1() on Python 2, needed by io.TextIOWrapper
+            myfile = io.BufferedReader(
+                gzip.GzipFile(fileobj=myfile, mode='rb')
+            )
+
+        ext = filename.rsplit('.', 1)[-1]
+
+        try:
+            if ext == 'vcf':
+                self.addresses = parse_vcard(
+                    myfile, newsletter, ignore_errors, encoding)
+
+            elif ext == 'ldif':
+                self.addresses = parse_ldif(
+                    myfile, newsletter, ignore_errors)
+
+            elif ext == 'csv':
+                self.addresses = parse_csv(
+                    myfile, newsletter, ignore_errors, encoding)
 
-        elif ext == 'csv':
-            self.addresses = parse_csv(
-                myvalue.file, newsletter, ignore_errors)
+            elif ext in ('jsonl', 'ndjson'):
+                self.addresses = parse_jsonl(
+                    myfile, newsletter, ignore_errors, encoding)
+
+            else:
+                raise forms.ValidationError(
+                    _("File extension '%s' was not recognized.") % ext)
+
+        except (IOError, EOFError) as e:
+            if not compressed:
+                raise
 
-        else:
             raise forms.ValidationError(
-                _("File extension '%s' was not recognized.") % ext)
+                _("Error reading compressed file: %s") % e)
 
-        if len(self.addresses) == 0:
+        if len(self.addresses) == 0 and not dry_run:
             raise forms.ValidationError(
                 _("No entries could found in this file."))
 
+        # Fill in the detected encoding, so a wrong guess can be corrected
+        if not encoding and self.addresses.encoding:
+            self.data = self.data.copy()
+            self.data[self.add_prefix('encoding')] = self.addresses.encoding
+
         return self.cleaned_data
 
+    def clean_encoding(self):
+        encoding = self.cleaned_data['encoding'].strip()
+
+        if encoding:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                raise forms.ValidationError(
+                    _("Encoding '%s' was not recognized.") % encoding)
+
+        return encoding
+
     def get_addresses(self):
-        return getattr(self, 'addresses', {})
+        return dict(getattr(self, 'addresses', {}))
+
+    def get_encoding(self):
+        """ Return the encoding the address file was read with, if any. """
+        return self.addresses.encoding
+
+    def get_report(self):
+        """ Return a report on the entries found in the address file. """
+        return self.addresses.get_report()
 
     newsletter = forms.ModelChoiceField(
         label=_("Newsletter"),
@@ -76,6 +137,14 @@ class ImportForm(forms.Form):
     ignore_errors = forms.BooleanField(
         label=_("Ignore non-fatal errors"),
         initial=False, required=False)
+    encoding = forms.CharField(
+        label=_("Encoding"), max_length=50, required=False,
+        help_text=_("Character encoding of the address file, e.g. 'utf-8' "
+                    "or 'latin-1'. Leave empty to detect automatically."))
+    dry_run = forms.BooleanField(
+        label=_("Dry run"), initial=False, required=False,
+        help_text=_("Only report on the contents of the file, without "
+                    "importing it."))
 
 
 class ConfirmForm(forms.Form):
@@ -167,6 +236,18 @@ class SubmissionAdminForm(forms.ModelForm):
 
         return publish
 
+    def clean(self):
+        """ Require subscriptions to be selected when sending to them. """
+        cleaned_data = super(SubmissionAdminForm, self).clean()
+
+        if cleaned_data.get('recipients') == Submission.RECIPIENTS_SELECTED \
+                and not cleaned_data.get('subscriptions'):
+            self.add_error('subscriptions', _(
+                'Select the subscriptions to send the message to.'
+            ))
+
+        return cleaned_data
+
 
 class ArticleFormSet(forms.BaseInlineFormSet):
     """ Formset for articles yielding default sortoder. """
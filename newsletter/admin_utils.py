@@ -43,8 +43,8 @@ class ExtendibleModelAdminMixin(object):
         return '%s_%s_%s' % info
 
 
-def make_subscription(newsletter, email, name=None):
-    addr = Subscription(subscribed=True)
+def make_subscription(newsletter, email, name=None, **kwargs):
+    addr = Subscription(subscribed=True, **kwargs)
 
     addr.newsletter = newsletter
     addr.email_field = email
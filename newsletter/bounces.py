@@ -0,0 +1,174 @@
+""" Processing of delivery status notifications (RFC 3464) for bounces. """
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import Counter, defaultdict
+from email.parser import HeaderParser
+
+from django.db import models, transaction
+
+from .models import (
+    Subscription, Suppression, BOUNCE_HEADER, BOUNCE_TOKEN_SALT
+)
+from .utils import check_token
+
+
+def get_original_headers(message):
+    """
+    Return the headers of the original message returned with a delivery
+    status notification, or None when it isn't included.
+    """
+    for part in message.walk():
+        content_type = part.get_content_type()
+
+        if content_type == 'message/rfc822':
+            payload = part.get_payload()
+
+            if payload:
+                return payload[0]
+
+        elif content_type == 'text/rfc822-headers':
+            return HeaderParser().parsestr(part.get_payload())
+
+    return None
+
+
+def parse_bounce(message):
+    """
+    Parse `message` as a delivery status notification. Returns a tuple of
+    the value of the bounce header of the original message (or None) and
+    the list of recipient addresses which failed permanently, or None if
+    `message` isn't a delivery status notification at all.
+    """
+    if message.get_content_type() != 'multipart/report':
+        return None
+
+    report_type = message.get_param('report-type') or ''
+    if report_type.lower() != 'delivery-status':
+        return None
+
+    failed = []
+
+    for part in message.walk():
+        if part.get_content_type() != 'message/delivery-status':
+            continue
+
+        # The first block has the per message fields, every other block
+        # the fields for a single recipient.
+        for block in part.get_payload()[1:]:
+            action = (block.get('Action') or '').strip().lower()
+            status = (block.get('Status') or '').strip()
+
+            # Delayed deliveries and temporary failures are no bounces
+            if action != 'failed' or not status.startswith('5'):
+                continue
+
+            recipient = block.get('Final-Recipient') or \
+                block.get('Original-Recipient') or ''
+
+            # Addresses are prefixed by their type, i.e. 'rfc822;'
+            failed.append(recipient.partition(';')[2].strip().lower())
+
+    headers = get_original_headers(message)
+
+    if headers is not None and headers.get(BOUNCE_HEADER):
+        token = headers.get(BOUNCE_HEADER).strip()
+    else:
+        token = None
+
+    return token, failed
+
+
+class BounceProcessor(object):
+    """
+    Count bounces per subscription, suppressing the addresses of
+    subscriptions which bounced `threshold` times.
+
+    The counters are updated for batches of `batch_size` subscriptions,
+    with a single UPDATE for all subscriptions bouncing equally often.
+    """
+
+    def __init__(self, threshold=3, batch_size=500):
+        self.threshold = threshold
+        self.batch_size = batch_size
+
+        # Number of bounces per subscription primary key, not yet saved
+        self.pending = Counter()
+
+        self.stats = Counter()
+
+    def process(self, message):
+        """
+        Process `message`, returning whether or not it was a delivery
+        status notification.
+        """
+
+        bounce = parse_bounce(message)
+
+        if bounce is None:
+            self.stats['ignored'] += 1
+            return False
+
+        token, failed = bounce
+
+        if not failed:
+            # Delayed or successful delivery
+            self.stats['ignored'] += 1
+            return True
+
+        pk = check_token(token, BOUNCE_TOKEN_SALT) if token else None
+
+        if pk is None:
+            logger.debug(
+                'Bounce for %s does not identify a subscription.',
+                ', '.join(failed)
+            )
+
+            self.stats['unmatched'] += 1
+            return True
+
+        self.stats['bounces'] += 1
+        self.pending[int(pk)] += 1
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+        return True
+
+    def flush(self):
+        """ Save pending bounces and suppress addresses bouncing too often. """
+
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, Counter()
+
+        by_count = defaultdict(list)
+        for pk, count in pending.items():
+            by_count[count].append(pk)
+
+        with transaction.atomic():
+            for count, pks in by_count.items():
+                Subscription.objects.filter(pk__in=pks).update(
+                    bounce_count=models.F('bounce_count') + count
+                )
+
+            emails = set(
+                subscription.email.lower()
+                for subscription in Subscription.objects.filter(
+                    pk__in=list(pending), bounce_count__gte=self.threshold
+                ).select_related('user')
+                if subscription.email
+            )
+
+            emails -= set(Suppression.objects.filter(
+                email__in=emails
+            ).values_list('email', flat=True))
+
+            Suppression.objects.bulk_create([
+                Suppression(email=email, reason=Suppression.REASON_BOUNCE)
+                for email in emails
+            ])
+
+        self.stats['suppressed'] += len(emails)
@@ -0,0 +1,113 @@
+""" Streaming export of subscriptions. """
+
+import io
+import itertools
+import json
+
+import unicodecsv
+
+from django.utils.encoding import force_text
+
+from .models import Newsletter
+
+
+# Columns of exported subscriptions
+EXPORT_FIELDS = (
+    'name', 'email', 'newsletter', 'subscribed', 'unsubscribed',
+    'subscribe_date', 'unsubscribe_date'
+)
+
+# Number of subscriptions fetched from the database at once
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def iter_subscriptions(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterate over the subscriptions in `queryset` in chunks ordered by primary
+    key, so only a single chunk is held in memory at any time regardless of
+    the database backend.
+    """
+
+    queryset = queryset.select_related('user').order_by('pk')
+
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+
+        chunk = list(chunk[:chunk_size])
+
+        for subscription in chunk:
+            yield subscription
+
+        if len(chunk) < chunk_size:
+            return
+
+        last_pk = chunk[-1].pk
+
+
+def iter_rows(queryset):
+    """ Yield a tuple with the values of EXPORT_FIELDS per subscription. """
+
+    # The number of newsletters is small, so avoid joining them in
+    slugs = dict(Newsletter.objects.values_list('pk', 'slug'))
+
+    for subscription in iter_subscriptions(queryset):
+        yield (
+            subscription.name or '',
+            subscription.email,
+            slugs.get(subscription.newsletter_id),
+            subscription.subscribed,
+            subscription.unsubscribed,
+            format_date(subscription.subscribe_date),
+            format_date(subscription.unsubscribe_date),
+        )
+
+
+def format_date(value):
+    if value:
+        return value.isoformat()
+
+    return None
+
+
+def export_csv(queryset):
+    """ Yield a header and subscriptions from `queryset` as lines of CSV. """
+
+    buf = io.BytesIO()
+    writer = unicodecsv.writer(buf, encoding='utf-8')
+
+    rows = itertools.chain([EXPORT_FIELDS], iter_rows(queryset))
+    for row in rows:
+        writer.writerow(row)
+
+        yield buf.getvalue().decode('utf-8')
+
+        # Start over with an empty buffer
+        buf.seek(0)
+        buf.truncate()
+
+
+def export_jsonl(queryset):
+    """ Yield subscriptions from `queryset` as lines of JSON objects. """
+
+    for row in iter_rows(queryset):
+        # Always text, as json.dumps() returns byte strings on Python 2
+        yield force_text(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False)
+        ) + u'\n'
+
+
+def export_subscriptions(queryset, export_format='csv'):
+    """ Return an iterator over `queryset` in the given export format. """
+
+    assert export_format in EXPORT_FORMATS, \
+        'Unknown export format: %s' % export_format
+
+    if export_format == 'jsonl':
+        return export_jsonl(queryset)
+
+    return export_csv(queryset)
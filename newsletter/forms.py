@@ -1,5 +1,6 @@
 from django import forms
 from django.forms.utils import ValidationError
+from django.utils.crypto import constant_time_compare
 from django.utils.translation import ugettext_lazy as _
 
 from .models import Subscription
@@ -128,7 +129,7 @@ class UpdateForm(NewsletterForm):
     def clean_user_activation_code(self):
         data = self.cleaned_data['user_activation_code']
 
-        if data != self.instance.activation_code:
+        if not constant_time_compare(data, self.instance.activation_code):
             raise ValidationError(
                 _('The validation code supplied by you does not match.')
             )
@@ -0,0 +1,16 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+from django_extensions.management.jobs import MinutelyJob
+
+from django.utils.translation import ugettext as _
+from newsletter.models import ActivationEmail
+
+
+class Job(MinutelyJob):
+    help = "Send queued activation emails."
+
+    def execute(self):
+        logger.info(_('Sending queued activation emails'))
+        ActivationEmail.send_queue()
@@ -0,0 +1,57 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.export import EXPORT_FORMATS, export_subscriptions
+from newsletter.models import Newsletter, Subscription
+
+
+class Command(BaseCommand):
+    help = (
+        "Export subscriptions as CSV or JSON Lines, streaming them in chunks "
+        "so memory use doesn't depend on the number of subscriptions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--newsletter', dest='newsletter',
+            help='Only export subscriptions to the newsletter with this slug.'
+        )
+        parser.add_argument(
+            '--format', dest='format', choices=EXPORT_FORMATS, default='csv',
+            help='Export format, defaults to csv.'
+        )
+        parser.add_argument(
+            '--all', action='store_true', dest='all', default=False,
+            help='Include unsubscribed and unactivated subscriptions.'
+        )
+        parser.add_argument(
+            '--output', dest='output',
+            help='File to write to, instead of standard output.'
+        )
+
+    def handle(self, **options):
+        queryset = Subscription.objects.all()
+
+        if options['newsletter']:
+            try:
+                newsletter = Newsletter.objects.get(slug=options['newsletter'])
+            except Newsletter.DoesNotExist:
+                raise CommandError(
+                    'Newsletter "%s" does not exist.' % options['newsletter']
+                )
+
+            queryset = queryset.filter(newsletter=newsletter)
+
+        if not options['all']:
+            queryset = queryset.filter(subscribed=True)
+
+        lines = export_subscriptions(queryset, options['format'])
+
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8',
+                         newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
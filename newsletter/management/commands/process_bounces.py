@@ -0,0 +1,103 @@
+import email
+import mailbox
+import os
+import sys
+
+import six
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.bounces import BounceProcessor
+
+
+class Command(BaseCommand):
+    help = (
+        "Process delivery status notifications of bounced messages from a "
+        "mbox file, a Maildir or standard input, counting bounces of "
+        "subscriptions and suppressing addresses which keep bouncing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source', nargs='?', default='-',
+            help='Path of a mbox file or Maildir, or - to read a single '
+                 'message from standard input (the default).'
+        )
+        parser.add_argument(
+            '--format', dest='format', choices=('mbox', 'maildir'),
+            help='Mailbox format, defaults to maildir for directories and '
+                 'mbox otherwise.'
+        )
+        parser.add_argument(
+            '--threshold', dest='threshold', type=int, default=3,
+            help='Number of bounces after which an address is suppressed, '
+                 'defaults to 3.'
+        )
+        parser.add_argument(
+            '--delete', action='store_true', dest='delete', default=False,
+            help='Remove processed delivery status notifications from the '
+                 'mailbox.'
+        )
+
+    def get_mailbox(self, source, mailbox_format):
+        if not os.path.exists(source):
+            raise CommandError('Mailbox "%s" does not exist.' % source)
+
+        if mailbox_format is None:
+            if os.path.isdir(source):
+                mailbox_format = 'maildir'
+            else:
+                mailbox_format = 'mbox'
+
+        if mailbox_format == 'maildir':
+            return mailbox.Maildir(source, factory=None, create=False)
+
+        return mailbox.mbox(source, factory=None, create=False)
+
+    def process_mailbox(self, processor, box, delete):
+        # Keep the MTA from changing the mailbox while it is processed
+        box.lock()
+
+        try:
+            processed = [
+                key for key, message in box.iteritems()
+                if processor.process(message)
+            ]
+
+            # Only remove bounces once they have been saved
+            processor.flush()
+
+            if delete:
+                for key in processed:
+                    box.discard(key)
+
+                box.flush()
+        finally:
+            box.unlock()
+            box.close()
+
+    def handle(self, **options):
+        processor = BounceProcessor(threshold=options['threshold'])
+
+        if options['source'] == '-':
+            stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+
+            if six.PY3:
+                message = email.message_from_binary_file(stdin)
+            else:
+                message = email.message_from_file(stdin)
+
+            processor.process(message)
+        else:
+            box = self.get_mailbox(options['source'], options['format'])
+
+            self.process_mailbox(processor, box, options['delete'])
+
+        processor.flush()
+
+        stats = processor.stats
+        self.stdout.write(
+            'Processed %d bounces, %d unmatched; suppressed %d addresses.' % (
+                stats['bounces'], stats['unmatched'], stats['suppressed']
+            )
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from newsletter.models import (
+    Newsletter, Subscription, COUNT_FIELDS, count_subscriptions
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate the subscription counters of newsletters, correcting "
+        "drift caused by changes bypassing the Subscription model (e.g. bulk "
+        "updates or raw SQL)."
+    )
+
+    def handle(self, **options):
+        # Count subscriptions of all newsletters in a single query
+        counts = count_subscriptions(Subscription.objects.all())
+
+        for newsletter in Newsletter.objects.all():
+            newsletter_counts = counts.get(
+                newsletter.pk, dict.fromkeys(COUNT_FIELDS, 0)
+            )
+
+            drift = dict(
+                (field, value - getattr(newsletter, field))
+                for field, value in newsletter_counts.items()
+                if value != getattr(newsletter, field)
+            )
+
+            if not drift:
+                continue
+
+            Newsletter.objects.filter(pk=newsletter.pk).update(
+                **newsletter_counts
+            )
+
+            self.stdout.write('Corrected counts for %s: %s' % (
+                newsletter.slug, ', '.join(
+                    '%s %+d' % (field, value)
+                    for field, value in sorted(drift.items())
+                )
+            ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from newsletter.scheduler import SubmissionScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a worker submitting prepared submissions as soon as their "
+        "publication date has passed, instead of on the hourly job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', dest='poll_interval', type=float, default=5,
+            help='Maximum number of seconds between checks for changed '
+                 'submissions, defaults to 5.'
+        )
+        parser.add_argument(
+            '--resync-interval', dest='resync_interval', type=float,
+            default=5 * 60,
+            help='Number of seconds after which the queue is reloaded '
+                 'regardless, defaults to 300.'
+        )
+        parser.add_argument(
+            '--once', action='store_true', dest='once', default=False,
+            help='Send the submissions currently due and exit.'
+        )
+
+    def handle(self, **options):
+        scheduler = SubmissionScheduler(
+            poll_interval=options['poll_interval'],
+            resync_interval=options['resync_interval']
+        )
+
+        if options['once']:
+            sent = scheduler.run_pending()
+
+            if options['verbosity'] > 0:
+                self.stdout.write('Sent %d submissions.' % sent)
+        else:
+            scheduler.run()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def calculate_subscription_counts(apps, schema_editor):
+    """ Initialize subscription counters of existing newsletters. """
+
+    Newsletter = apps.get_model('newsletter', 'Newsletter')
+    Subscription = apps.get_model('newsletter', 'Subscription')
+
+    rows = Subscription.objects.values(
+        'newsletter', 'subscribed', 'unsubscribed'
+    ).annotate(count=models.Count('pk'))
+
+    counts = {}
+    for row in rows:
+        if row['subscribed']:
+            field = 'subscribed_count'
+        elif row['unsubscribed']:
+            field = 'unsubscribed_count'
+        else:
+            field = 'unactivated_count'
+
+        newsletter_counts = counts.setdefault(row['newsletter'], {})
+        newsletter_counts[field] = \
+            newsletter_counts.get(field, 0) + row['count']
+
+    for newsletter_id, newsletter_counts in counts.items():
+        Newsletter.objects.filter(pk=newsletter_id).update(
+            **newsletter_counts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_auto_20160226_1518'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='subscribed_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='subscribed'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='unactivated_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='unactivated'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='unsubscribed_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='unsubscribed'),
+        ),
+        migrations.RunPython(
+            calculate_subscription_counts, migrations.RunPython.noop
+        ),
+    ]
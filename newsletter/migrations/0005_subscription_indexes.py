@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Partial index on active subscriptions per newsletter in primary key order,
+# as used for paging through recipients. Only created on PostgreSQL; SQLite
+# cannot match partial indexes against the bound parameters Django uses and
+# there the composite (newsletter, subscribed) index implicitly ends with the
+# rowid anyway.
+ACTIVE_INDEX_NAME = 'newsletter_subscription_active'
+
+
+def create_active_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX %s ON %s (%s, %s) WHERE %s' % (
+                schema_editor.quote_name(ACTIVE_INDEX_NAME),
+                schema_editor.quote_name('newsletter_subscription'),
+                schema_editor.quote_name('newsletter_id'),
+                schema_editor.quote_name('id'),
+                schema_editor.quote_name('subscribed')
+            )
+        )
+
+
+def drop_active_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX %s' % schema_editor.quote_name(ACTIVE_INDEX_NAME)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0004_subscription_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='subscribed',
+            field=models.BooleanField(default=False, verbose_name='subscribed'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='unsubscribed',
+            field=models.BooleanField(default=False, verbose_name='unsubscribed'),
+        ),
+        migrations.AlterIndexTogether(
+            name='subscription',
+            index_together=set([('newsletter', 'email_field'), ('newsletter', 'user'), ('newsletter', 'subscribed')]),
+        ),
+        migrations.RunPython(create_active_index, drop_active_index),
+    ]
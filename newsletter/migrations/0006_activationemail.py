@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0005_subscription_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivationEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('subscribe', 'subscribe'), ('unsubscribe', 'unsubscribe'), ('update', 'update')], max_length=11, verbose_name='action')),
+                ('create_date', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='attempts')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='newsletter.Subscription', verbose_name='subscription')),
+            ],
+            options={
+                'verbose_name': 'activation email',
+                'verbose_name_plural': 'activation emails',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0006_activationemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'low'), (1, 'normal'), (2, 'high')], default=1, help_text='Submissions with a higher priority are sent faster when several submissions are being sent at once.', verbose_name='priority'),
+        ),
+    ]
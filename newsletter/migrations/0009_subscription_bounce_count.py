@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0008_suppression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='bounce_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='bounces'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def select_existing_recipients(apps, schema_editor):
+    """
+    Existing submissions keep sending to the subscriptions which have been
+    selected when creating them.
+    """
+
+    Submission = apps.get_model('newsletter', 'Submission')
+
+    Submission.objects.update(recipients='selected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0009_subscription_bounce_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='recipients',
+            field=models.CharField(choices=[('all', 'all subscribers'), ('users', 'subscribers with a user account'), ('anonymous', 'subscribers without a user account'), ('selected', 'selected subscriptions')], default='all', help_text='Subscribers of the newsletter are looked up when the submission is being sent.', max_length=10, verbose_name='send to'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='subscriptions',
+            field=models.ManyToManyField(blank=True, db_index=True, help_text='Only used when sending to selected subscriptions.', to='newsletter.Subscription', verbose_name='recipients'),
+        ),
+        migrations.RunPython(
+            select_existing_recipients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0010_submission_recipients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activationemail',
+            name='claim_date',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='claimed'),
+        ),
+    ]
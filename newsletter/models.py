@@ -1,11 +1,18 @@
 import logging
+import uuid
+import warnings
+
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.contrib.sites.managers import CurrentSiteManager
-from django.core.mail import EmailMultiAlternatives
-from django.core.urlresolvers import reverse
-from django.db import models
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.db.models import permalink
 from django.template import Context
 from django.template.loader import select_template
@@ -17,9 +24,12 @@ from django.utils.timezone import now
 
 from sorl.thumbnail import ImageField
 
+from .settings import newsletter_settings
 from .utils import (
-    make_activation_code, get_default_sites, ACTIONS
+    make_activation_code, make_token, get_default_sites, ACTIONS, URLTemplate,
+    BloomFilter
 )
+from .validators import get_nouser_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +61,17 @@ class Newsletter(models.Model):
         help_text=_('Whether or not to send HTML versions of e-mails.')
     )
 
+    # Number of subscriptions per status, maintained by Subscription
+    subscribed_count = models.IntegerField(
+        default=0, editable=False, verbose_name=_('subscribed')
+    )
+    unsubscribed_count = models.IntegerField(
+        default=0, editable=False, verbose_name=_('unsubscribed')
+    )
+    unactivated_count = models.IntegerField(
+        default=0, editable=False, verbose_name=_('unactivated')
+    )
+
     objects = models.Manager()
 
     # Automatically filter the current site
@@ -61,10 +82,26 @@ class Newsletter(models.Model):
         Return a subject, text, HTML tuple with e-mail templates for
         a particular action. Returns a tuple with subject, text and e-mail
         template.
+
+        Resolved templates are cached for the process, unless in DEBUG mode.
         """
 
         assert action in ACTIONS + ('message', ), 'Unknown action: %s' % action
 
+        key = (self.slug, action, self.send_html)
+
+        if not settings.DEBUG and key in TEMPLATES_CACHE:
+            return TEMPLATES_CACHE[key]
+
+        templates = self.select_templates(action)
+
+        TEMPLATES_CACHE[key] = templates
+
+        return templates
+
+    def select_templates(self, action):
+        """ Look up the e-mail templates for a particular action. """
+
         # Common substitutions for filenames
         tpl_subst = {
             'action': action,
@@ -140,11 +177,93 @@ class Newsletter(models.Model):
     def get_sender(self):
         return u'%s <%s>' % (self.sender, self.email)
 
+    def get_message_context(self, site=None):
+        """
+        Return the context for rendering messages of this newsletter which
+        does not depend on the message or its recipient.
+        """
+        if site is None:
+            site = Site.objects.get_current()
+
+        return {
+            'site': site,
+            'newsletter': self,
+            'sender': self.get_sender(),
+            'unsubscribe_url': 'http://%s%s' % (
+                site.domain, self.unsubscribe_url()
+            ),
+            'STATIC_URL': settings.STATIC_URL,
+            'MEDIA_URL': settings.MEDIA_URL
+        }
+
     def get_subscriptions(self):
         logger.debug(u'Looking up subscribers for %s', self)
 
         return Subscription.objects.filter(newsletter=self, subscribed=True)
 
+    def get_subscription_counts(self):
+        """
+        Count the subscriptions of this newsletter per status, returning a
+        dictionary with values for the counter fields.
+        """
+        counts = count_subscriptions(
+            Subscription.objects.filter(newsletter=self)
+        )
+
+        return counts.get(self.pk, dict.fromkeys(COUNT_FIELDS, 0))
+
+    def update_subscription_counts(self):
+        """
+        Recalculate the subscription counters from the actual subscriptions,
+        returning whether they had drifted.
+        """
+        counts = self.get_subscription_counts()
+
+        changed = any(
+            getattr(self, field) != value for field, value in counts.items()
+        )
+
+        Newsletter.objects.filter(pk=self.pk).update(**counts)
+
+        for field, value in counts.items():
+            setattr(self, field, value)
+
+        return changed
+
+    def save(self, *args, **kwargs):
+        """
+        Leave the subscription counters alone when updating, as they are
+        maintained in the database and likely stale on this instance.
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and \
+                kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNT_FIELDS
+            ]
+
+        return super(Newsletter, self).save(*args, **kwargs)
+
+    @classmethod
+    def get_visible(cls):
+        """
+        Return the list of visible newsletters of the current site, cached
+        until a newsletter is changed.
+        """
+        cache_key = get_visible_cache_key(settings.SITE_ID)
+
+        newsletters = cache.get(cache_key)
+
+        if newsletters is None:
+            newsletters = list(cls.on_site.filter(visible=True))
+
+            cache.set(
+                cache_key, newsletters,
+                newsletter_settings.LIST_CACHE_TIMEOUT
+            )
+
+        return newsletters
+
     @classmethod
     def get_default(cls):
         try:
@@ -153,6 +272,80 @@ class Newsletter(models.Model):
             return None
 
 
+def get_visible_cache_key(site_id):
+    """ Cache key for the visible newsletters of a site. """
+    return 'newsletter_visible_%d' % site_id
+
+
+# Resolved e-mail templates, keyed by (newsletter slug, action, send_html)
+TEMPLATES_CACHE = {}
+
+
+def clear_templates_cache():
+    TEMPLATES_CACHE.clear()
+
+
+# Newsletter counter fields for the status of subscriptions
+COUNT_FIELDS = ('subscribed_count', 'unsubscribed_count', 'unactivated_count')
+
+
+def get_count_field(subscribed, unsubscribed):
+    """ Return the Newsletter counter field for a subscription status. """
+
+    if subscribed:
+        return 'subscribed_count'
+    elif unsubscribed:
+        return 'unsubscribed_count'
+    else:
+        return 'unactivated_count'
+
+
+def count_subscriptions(queryset):
+    """
+    Count the subscriptions in `queryset` per newsletter and status, in a
+    single query. Returns a dictionary mapping newsletter id's into
+    dictionaries with values for the counter fields.
+    """
+
+    counts = {}
+
+    rows = queryset.order_by().values(
+        'newsletter', 'subscribed', 'unsubscribed'
+    ).annotate(count=models.Count('pk'))
+
+    for row in rows:
+        newsletter_counts = counts.setdefault(
+            row['newsletter'], dict.fromkeys(COUNT_FIELDS, 0)
+        )
+
+        field = get_count_field(row['subscribed'], row['unsubscribed'])
+        newsletter_counts[field] += row['count']
+
+    return counts
+
+
+def update_counts(old_state, new_state):
+    """
+    Update Newsletter counters for a subscription changing from `old_state`
+    to `new_state`, both being (newsletter id, counter field) tuples or None.
+    """
+
+    if old_state == new_state:
+        return
+
+    if old_state:
+        newsletter_id, field = old_state
+        Newsletter.objects.filter(pk=newsletter_id).update(
+            **{field: models.F(field) - 1}
+        )
+
+    if new_state:
+        newsletter_id, field = new_state
+        Newsletter.objects.filter(pk=newsletter_id).update(
+            **{field: models.F(field) + 1}
+        )
+
+
 @python_2_unicode_compatible
 class Subscription(models.Model):
     user = models.ForeignKey(
@@ -165,12 +358,12 @@ class Subscription(models.Model):
     )
 
     def get_name(self):
-        if self.user:
+        if self.user_id:
             return self.user.get_full_name()
         return self.name_field
 
     def set_name(self, name):
-        if not self.user:
+        if not self.user_id:
             self.name_field = name
     name = property(get_name, set_name)
 
@@ -180,12 +373,12 @@ class Subscription(models.Model):
     )
 
     def get_email(self):
-        if self.user:
+        if self.user_id:
             return self.user.email
         return self.email_field
 
     def set_email(self, email):
-        if not self.user:
+        if not self.user_id:
             self.email_field = email
     email = property(get_email, set_email)
 
@@ -260,38 +453,59 @@ class Subscription(models.Model):
         # one attribute 'subscribe' later. In this case unsubscribed can be
         # replaced by a method property.
 
-        if self.pk:
-            assert(Subscription.objects.filter(pk=self.pk).count() == 1)
-
-            subscription = Subscription.objects.get(pk=self.pk)
-            old_subscribed = subscription.subscribed
-            old_unsubscribed = subscription.unsubscribed
-
-            # If we are subscribed now and we used not to be so, subscribe.
-            # If we user to be unsubscribed but are not so anymore, subscribe.
-            if ((self.subscribed and not old_subscribed) or
-               (old_unsubscribed and not self.unsubscribed)):
-                self._subscribe()
-
-                assert not self.unsubscribed
-                assert self.subscribed
+        # Keep the newsletter counters consistent with the subscription
+        with transaction.atomic():
+            old_state = None
+
+            if self.pk:
+                assert(Subscription.objects.filter(pk=self.pk).count() == 1)
+
+                # Lock the row, so concurrent changes can't both start from
+                # the same state and count it twice.
+                subscription = Subscription.objects.select_for_update().get(
+                    pk=self.pk
+                )
+                old_subscribed = subscription.subscribed
+                old_unsubscribed = subscription.unsubscribed
+
+                old_state = (
+                    subscription.newsletter_id,
+                    get_count_field(old_subscribed, old_unsubscribed)
+                )
+
+                # If we are subscribed now and we used not to be so,
+                # subscribe. If we user to be unsubscribed but are not so
+                # anymore, subscribe.
+                if ((self.subscribed and not old_subscribed) or
+                   (old_unsubscribed and not self.unsubscribed)):
+                    self._subscribe()
+
+                    assert not self.unsubscribed
+                    assert self.subscribed
+
+                # If we are unsubcribed now and we used not to be so,
+                # unsubscribe. If we used to be subscribed but are not
+                # subscribed anymore, unsubscribe.
+                elif ((self.unsubscribed and not old_unsubscribed) or
+                      (old_subscribed and not self.subscribed)):
+                    self._unsubscribe()
+
+                    assert not self.subscribed
+                    assert self.unsubscribed
+            else:
+                if self.subscribed:
+                    self._subscribe()
+                elif self.unsubscribed:
+                    self._unsubscribe()
+
+            new_state = (
+                self.newsletter_id,
+                get_count_field(self.subscribed, self.unsubscribed)
+            )
 
-            # If we are unsubcribed now and we used not to be so, unsubscribe.
-            # If we used to be subscribed but are not subscribed anymore,
-            # unsubscribe.
-            elif ((self.unsubscribed and not old_unsubscribed) or
-                  (old_subscribed and not self.subscribed)):
-                self._unsubscribe()
+            super(Subscription, self).save(*args, **kwargs)
 
-                assert not self.subscribed
-                assert self.unsubscribed
-        else:
-            if self.subscribed:
-                self._subscribe()
-            elif self.unsubscribed:
-                self._unsubscribe()
-
-        super(Subscription, self).save(*args, **kwargs)
+            update_counts(old_state, new_state)
 
     ip = models.GenericIPAddressField(_("IP address"), blank=True, null=True)
 
@@ -305,7 +519,7 @@ class Subscription(models.Model):
     )
 
     subscribed = models.BooleanField(
-        default=False, verbose_name=_('subscribed'), db_index=True
+        default=False, verbose_name=_('subscribed')
     )
     subscribe_date = models.DateTimeField(
         verbose_name=_("subscribe date"), null=True, blank=True
@@ -313,12 +527,16 @@ class Subscription(models.Model):
 
     # This should be a pseudo-field, I reckon.
     unsubscribed = models.BooleanField(
-        default=False, verbose_name=_('unsubscribed'), db_index=True
+        default=False, verbose_name=_('unsubscribed')
     )
     unsubscribe_date = models.DateTimeField(
         verbose_name=_("unsubscribe date"), null=True, blank=True
     )
 
+    bounce_count = models.PositiveIntegerField(
+        default=0, verbose_name=_('bounces'), editable=False
+    )
+
     def __str__(self):
         if self.name:
             return _(u"%(name)s <%(email)s> to %(newsletter)s") % {
@@ -337,6 +555,12 @@ class Subscription(models.Model):
         verbose_name = _('subscription')
         verbose_name_plural = _('subscriptions')
         unique_together = ('user', 'email_field', 'newsletter')
+        # Subscriptions are nearly always looked up within a newsletter
+        index_together = (
+            ('newsletter', 'subscribed'),
+            ('newsletter', 'email_field'),
+            ('newsletter', 'user'),
+        )
 
     def get_recipient(self):
         if self.name:
@@ -344,7 +568,22 @@ class Subscription(models.Model):
 
         return u'%s' % (self.email)
 
-    def send_activation_email(self, action):
+    def queue_activation_email(self, action):
+        """
+        Queue the activation email for `action` in the outbox, or send it
+        right away if the outbox is disabled.
+        """
+        if newsletter_settings.ACTIVATION_EMAIL_OUTBOX:
+            ActivationEmail.objects.create(subscription=self, action=action)
+
+            logger.debug(
+                u'Activation email queued for action "%(action)s" to '
+                u'%(subscriber)s.', {'action': action, 'subscriber': self}
+            )
+        else:
+            self.send_activation_email(action)
+
+    def send_activation_email(self, action, connection=None):
         assert action in ACTIONS, 'Unknown action: %s' % action
 
         (subject_template, text_template, html_template) = \
@@ -367,7 +606,8 @@ class Subscription(models.Model):
         message = EmailMultiAlternatives(
             subject, text,
             from_email=self.newsletter.get_sender(),
-            to=[self.email]
+            to=[self.email],
+            connection=connection
         )
 
         if html_template:
@@ -388,32 +628,288 @@ class Subscription(models.Model):
             }
         )
 
-    @permalink
+    def get_activate_url(self, action):
+        return ACTIVATE_URLS[action](
+            newsletter_slug=self.newsletter.slug,
+            email=self.email,
+            activation_code=self.activation_code
+        )
+
     def subscribe_activate_url(self):
-        return ('newsletter_update_activate', (), {
-            'newsletter_slug': self.newsletter.slug,
-            'email': self.email,
-            'action': 'subscribe',
-            'activation_code': self.activation_code
-        })
+        return self.get_activate_url('subscribe')
 
-    @permalink
     def unsubscribe_activate_url(self):
-        return ('newsletter_update_activate', (), {
-            'newsletter_slug': self.newsletter.slug,
-            'email': self.email,
-            'action': 'unsubscribe',
-            'activation_code': self.activation_code
-        })
+        return self.get_activate_url('unsubscribe')
 
-    @permalink
     def update_activate_url(self):
-        return ('newsletter_update_activate', (), {
-            'newsletter_slug': self.newsletter.slug,
-            'email': self.email,
-            'action': 'update',
-            'activation_code': self.activation_code
-        })
+        return self.get_activate_url('update')
+
+    def get_unsubscribe_token(self):
+        """ Return a token for one-click unsubscription. """
+        return make_token(self.pk, UNSUBSCRIBE_TOKEN_SALT)
+
+    def get_bounce_token(self):
+        """
+        Return a token identifying the subscription in bounced messages.
+        """
+        return make_token(self.pk, BOUNCE_TOKEN_SALT)
+
+    def one_click_unsubscribe_url(self):
+        return ONE_CLICK_UNSUBSCRIBE_URL(
+            newsletter_slug=self.newsletter.slug,
+            token=self.get_unsubscribe_token()
+        )
+
+    @classmethod
+    def unsubscribe_by_pk(cls, pk):
+        """
+        Unsubscribe the subscription with primary key `pk`, using a single
+        conditional UPDATE instead of loading and saving it. Returns whether
+        the subscription was unsubscribed, as opposed to not being
+        subscribed (anymore).
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(pk=pk, subscribed=True).update(
+                subscribed=False, unsubscribed=True, unsubscribe_date=now()
+            )
+
+            if updated:
+                Newsletter.objects.filter(subscription__pk=pk).update(
+                    subscribed_count=models.F('subscribed_count') - 1,
+                    unsubscribed_count=models.F('unsubscribed_count') + 1
+                )
+
+        return bool(updated)
+
+
+# Builders of activation URL's, which are generated for every recipient
+ACTIVATE_URLS = dict(
+    (action, URLTemplate(
+        'newsletter_update_activate',
+        ('newsletter_slug', 'email', 'activation_code'), action=action
+    ))
+    for action in ACTIONS
+)
+
+ONE_CLICK_UNSUBSCRIBE_URL = URLTemplate(
+    'newsletter_unsubscribe_one_click', ('newsletter_slug', 'token')
+)
+
+UNSUBSCRIBE_TOKEN_SALT = 'newsletter.unsubscribe'
+BOUNCE_TOKEN_SALT = 'newsletter.bounce'
+
+# Header identifying the subscription a message was sent for, which is
+# included in delivery status notifications for bounced messages.
+BOUNCE_HEADER = 'X-Newsletter-Subscription'
+
+
+# Time after which an activation email claimed by a process which didn't
+# finish sending it may be claimed again
+ACTIVATION_EMAIL_CLAIM_TIMEOUT = timedelta(hours=1)
+
+
+@python_2_unicode_compatible
+class ActivationEmail(models.Model):
+    """
+    Activation email for a subscription, queued to be sent outside of the
+    request/response cycle.
+    """
+
+    subscription = models.ForeignKey(
+        'Subscription', verbose_name=_('subscription')
+    )
+    action = models.CharField(
+        max_length=11, verbose_name=_('action'),
+        choices=[(action, action) for action in ACTIONS]
+    )
+
+    create_date = models.DateTimeField(
+        verbose_name=_('created'), auto_now_add=True, editable=False
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name=_('attempts'), editable=False
+    )
+    claim_date = models.DateTimeField(
+        verbose_name=_('claimed'), null=True, editable=False
+    )
+
+    class Meta:
+        verbose_name = _('activation email')
+        verbose_name_plural = _('activation emails')
+
+    def __str__(self):
+        return _(u"%(action)s email to %(subscription)s") % {
+            'action': self.action,
+            'subscription': self.subscription
+        }
+
+    @classmethod
+    def get_unclaimed(cls):
+        """
+        Return the emails which are not being sent, including those claimed
+        by a process which didn't finish sending them in time.
+        """
+        return cls.objects.filter(
+            models.Q(claim_date__isnull=True) |
+            models.Q(claim_date__lt=now() - ACTIVATION_EMAIL_CLAIM_TIMEOUT)
+        )
+
+    def claim(self):
+        """
+        Mark the email as being sent and count the attempt, unless another
+        process claimed it in the meantime. Returns whether or not the email
+        was claimed.
+        """
+        claimed = self.get_unclaimed().filter(
+            pk=self.pk, attempts=self.attempts
+        ).update(claim_date=now(), attempts=models.F('attempts') + 1)
+
+        return bool(claimed)
+
+    @classmethod
+    def send_queue(cls, batch_size=100, max_attempts=5):
+        """
+        Send the queued activation emails in batches, each over a single
+        connection. Every email is claimed before sending it, counting the
+        attempt. Sent emails are removed from the queue, emails failing
+        `max_attempts` times remain in it for inspection.
+        """
+
+        queue = cls.get_unclaimed().filter(
+            attempts__lt=max_attempts
+        ).select_related(
+            'subscription__newsletter', 'subscription__user'
+        ).order_by('pk')
+
+        last_pk = 0
+        while True:
+            batch = list(queue.filter(pk__gt=last_pk)[:batch_size])
+
+            if not batch:
+                return
+
+            last_pk = batch[-1].pk
+
+            sent = []
+            failed = []
+
+            with get_connection() as connection:
+                for email in batch:
+                    if not email.claim():
+                        continue
+
+                    try:
+                        email.subscription.send_activation_email(
+                            email.action, connection=connection
+                        )
+                        sent.append(email.pk)
+
+                    except Exception as e:
+                        logger.error(
+                            u'Activation email %s failed with error: %s',
+                            email, e
+                        )
+                        failed.append(email.pk)
+
+            cls.objects.filter(pk__in=sent).delete()
+
+            # Failed emails can be retried right away by the next run
+            cls.objects.filter(pk__in=failed).update(claim_date=None)
+
+
+# Number of suppressed addresses above which a Bloom filter is used instead
+# of a set to look them up while sending
+SUPPRESSION_SET_LIMIT = 100000
+
+
+class SuppressionList(object):
+    """
+    In-memory lookup of suppressed e-mail addresses, loaded once for every
+    submission.
+
+    Up to `SUPPRESSION_SET_LIMIT` addresses are kept in a set. Larger
+    lists are kept in a Bloom filter, using a fraction of the memory, and
+    addresses it reports are confirmed in the database, per batch.
+    """
+
+    def __init__(self, limit=SUPPRESSION_SET_LIMIT):
+        emails = Suppression.objects.values_list('email', flat=True)
+        count = emails.count()
+
+        if count > limit:
+            self.emails = BloomFilter(count)
+
+            for email in emails.iterator():
+                self.emails.add(email)
+
+            self.exact = False
+        else:
+            self.emails = set(emails.iterator())
+            self.exact = True
+
+    def get_suppressed(self, emails):
+        """ Return the set of suppressed addresses among `emails`. """
+
+        candidates = set(
+            email for email in (e.lower() for e in emails)
+            if email in self.emails
+        )
+
+        if self.exact or not candidates:
+            return candidates
+
+        # Weed out false positives of the Bloom filter
+        return set(Suppression.objects.filter(
+            email__in=candidates
+        ).values_list('email', flat=True))
+
+
+@python_2_unicode_compatible
+class Suppression(models.Model):
+    """
+    E-mail address no messages are sent to, whichever newsletters it is
+    subscribed to, i.e. because mail to it bounced.
+    """
+
+    REASON_BOUNCE = 'bounce'
+    REASON_COMPLAINT = 'complaint'
+    REASON_MANUAL = 'manual'
+
+    REASON_CHOICES = (
+        (REASON_BOUNCE, _('bounce')),
+        (REASON_COMPLAINT, _('complaint')),
+        (REASON_MANUAL, _('manual')),
+    )
+
+    email = models.EmailField(
+        verbose_name=_('e-mail'), max_length=254, unique=True
+    )
+    reason = models.CharField(
+        max_length=16, verbose_name=_('reason'), choices=REASON_CHOICES,
+        default=REASON_MANUAL
+    )
+
+    create_date = models.DateTimeField(
+        verbose_name=_('created'), default=now, editable=False
+    )
+
+    class Meta:
+        verbose_name = _('suppression')
+        verbose_name_plural = _('suppressions')
+
+    def __str__(self):
+        return self.email
+
+    def clean(self):
+        # Lowercase before uniqueness is validated, like when saving
+        if self.email:
+            self.email = self.email.lower()
+
+    def save(self, *args, **kwargs):
+        # Addresses are looked up case insensitively
+        self.email = self.email.lower()
+
+        return super(Suppression, self).save(*args, **kwargs)
 
 
 @python_2_unicode_compatible
@@ -540,6 +1036,13 @@ class Message(models.Model):
             return None
 
 
+# Cache key changed whenever a submission is saved or deleted
+SUBMISSION_QUEUE_CACHE_KEY = 'newsletter_submission_queue'
+
+# Number of recipients a submission is sent to per batch
+SUBMIT_BATCH_SIZE = 100
+
+
 @python_2_unicode_compatible
 class Submission(models.Model):
     """
@@ -551,6 +1054,28 @@ class Submission(models.Model):
         verbose_name = _('submission')
         verbose_name_plural = _('submissions')
 
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_HIGH = 2
+
+    PRIORITY_CHOICES = (
+        (PRIORITY_LOW, _('low')),
+        (PRIORITY_NORMAL, _('normal')),
+        (PRIORITY_HIGH, _('high')),
+    )
+
+    RECIPIENTS_ALL = 'all'
+    RECIPIENTS_USERS = 'users'
+    RECIPIENTS_ANONYMOUS = 'anonymous'
+    RECIPIENTS_SELECTED = 'selected'
+
+    RECIPIENTS_CHOICES = (
+        (RECIPIENTS_ALL, _('all subscribers')),
+        (RECIPIENTS_USERS, _('subscribers with a user account')),
+        (RECIPIENTS_ANONYMOUS, _('subscribers without a user account')),
+        (RECIPIENTS_SELECTED, _('selected subscriptions')),
+    )
+
     def __str__(self):
         return _(u"%(newsletter)s on %(publish_date)s") % {
             'newsletter': self.message,
@@ -558,17 +1083,91 @@ class Submission(models.Model):
         }
 
     @cached_property
-    def extra_headers(self):
+    def render_context(self):
+        """
+        Context for rendering the message which is the same for all
+        recipients, computed once per submission.
+        """
+        context = self.newsletter.get_message_context()
+
+        context.update({
+            'submission': self,
+            'message': self.message,
+            'date': self.publish_date,
+            'archive_url': 'http://%s%s' % (
+                context['site'].domain, self.get_absolute_url()
+            ) if self.publish else None
+        })
+
+        return context
+
+    def get_extra_headers(self, subscription):
+        """
+        Return headers for the message to `subscription`, allowing to
+        unsubscribe with a single click (RFC 8058) and to identify the
+        subscription when the message bounces.
+
+        One-click unsubscribe links are required to use HTTPS.
+        """
         return {
-            'List-Unsubscribe': 'http://%s%s' % (
-                Site.objects.get_current().domain,
-                reverse('newsletter_unsubscribe_request',
-                        args=[self.message.newsletter.slug])
+            'List-Unsubscribe': '<https://%s%s>' % (
+                self.render_context['site'].domain,
+                subscription.one_click_unsubscribe_url()
             ),
+            'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+            BOUNCE_HEADER: subscription.get_bounce_token(),
+        }
+
+    def get_recipients(self):
+        """
+        Return the active subscriptions to send the message to. Unless
+        subscriptions have been selected, these are looked up from the
+        newsletter when sending, so subscribers joining in the meantime
+        receive the message as well.
+        """
+        if self.recipients == self.RECIPIENTS_SELECTED:
+            return self.subscriptions.filter(subscribed=True)
+
+        subscriptions = self.newsletter.get_subscriptions()
+
+        if self.recipients == self.RECIPIENTS_USERS:
+            subscriptions = subscriptions.filter(user__isnull=False)
+        elif self.recipients == self.RECIPIENTS_ANONYMOUS:
+            subscriptions = subscriptions.filter(user__isnull=True)
+
+        return subscriptions
+
+    @property
+    def extra_headers(self):
+        """
+        Deprecated, headers for messages of this submission which don't
+        depend on the recipient. Use `get_extra_headers()` instead.
+        """
+        warnings.warn(
+            'Submission.extra_headers is deprecated, use '
+            'Submission.get_extra_headers(subscription) instead.',
+            DeprecationWarning, stacklevel=2
+        )
+
+        return {
+            'List-Unsubscribe': self.render_context['unsubscribe_url'],
         }
 
     def submit(self):
-        subscriptions = self.subscriptions.filter(subscribed=True)
+        for sent in self.submit_batches():
+            pass
+
+    def submit_batches(self, batch_size=SUBMIT_BATCH_SIZE):
+        """
+        Submit the message in batches of at most `batch_size` recipients,
+        yielding the number of recipients processed after every batch. This
+        allows interleaving the batches of several submissions.
+
+        Suppressed addresses are skipped.
+        """
+        subscriptions = self.get_recipients().select_related(
+            'newsletter', 'user'
+        ).order_by('pk')
 
         logger.info(
             ugettext(u"Submitting %(submission)s to %(count)d people"),
@@ -581,9 +1180,37 @@ class Submission(models.Model):
         self.sending = True
         self.save()
 
+        # Prepare everything not depending on the recipient up front
+        self.render_context
+        suppressions = SuppressionList()
+
         try:
-            for subscription in subscriptions:
-                self.send_message(subscription)
+            last_pk = 0
+
+            while True:
+                batch = list(subscriptions.filter(pk__gt=last_pk)[:batch_size])
+
+                if not batch:
+                    break
+
+                suppressed = suppressions.get_suppressed(
+                    subscription.email for subscription in batch
+                )
+
+                for subscription in batch:
+                    if subscription.email.lower() in suppressed:
+                        logger.debug(
+                            ugettext(u'Skipping suppressed address: %s.'),
+                            subscription
+                        )
+                        continue
+
+                    self.send_message(subscription)
+
+                last_pk = batch[-1].pk
+
+                yield len(batch)
+
             self.sent = True
 
         finally:
@@ -591,16 +1218,7 @@ class Submission(models.Model):
             self.save()
 
     def send_message(self, subscription):
-        variable_dict = {
-            'subscription': subscription,
-            'site': Site.objects.get_current(),
-            'submission': self,
-            'message': self.message,
-            'newsletter': self.newsletter,
-            'date': self.publish_date,
-            'STATIC_URL': settings.STATIC_URL,
-            'MEDIA_URL': settings.MEDIA_URL
-        }
+        variable_dict = dict(self.render_context, subscription=subscription)
 
         unescaped_context = Context(variable_dict, autoescape=False)
 
@@ -610,9 +1228,9 @@ class Submission(models.Model):
 
         message = EmailMultiAlternatives(
             subject, text,
-            from_email=self.newsletter.get_sender(),
+            from_email=variable_dict['sender'],
             to=[subscription.get_recipient()],
-            headers=self.extra_headers,
+            headers=self.get_extra_headers(subscription),
         )
 
         if self.message.html_template:
@@ -640,15 +1258,32 @@ class Submission(models.Model):
                  'error': e}
             )
 
+    def claim(self):
+        """
+        Mark the submission as sending, unless it has been claimed by
+        another process or isn't due anymore. Returns whether or not the
+        submission was claimed.
+        """
+        claimed = Submission.objects.filter(
+            pk=self.pk, prepared=True, sent=False, sending=False,
+            publish_date__lt=now()
+        ).update(sending=True)
+
+        if claimed:
+            self.sending = True
+
+        return bool(claimed)
+
     @classmethod
     def submit_queue(cls):
         todo = cls.objects.filter(
             prepared=True, sent=False, sending=False,
             publish_date__lt=now()
-        )
+        ).order_by('-priority', 'publish_date')
 
         for submission in todo:
-            submission.submit()
+            if submission.claim():
+                submission.submit()
 
     @classmethod
     def from_message(cls, message):
@@ -657,7 +1292,6 @@ class Submission(models.Model):
         submission.message = message
         submission.newsletter = message.newsletter
         submission.save()
-        submission.subscriptions = message.newsletter.get_subscriptions()
         return submission
 
     def save(self):
@@ -690,10 +1324,15 @@ class Submission(models.Model):
         'Message', verbose_name=_('message'), editable=True, null=False
     )
 
+    recipients = models.CharField(
+        max_length=10, default=RECIPIENTS_ALL, choices=RECIPIENTS_CHOICES,
+        verbose_name=_('send to'),
+        help_text=_('Subscribers of the newsletter are looked up when the '
+                    'submission is being sent.')
+    )
     subscriptions = models.ManyToManyField(
         'Subscription',
-        help_text=_('If you select none, the system will automatically find '
-                    'the subscribers for you.'),
+        help_text=_('Only used when sending to selected subscriptions.'),
         blank=True, db_index=True, verbose_name=_('recipients'),
         limit_choices_to={'subscribed': True}
     )
@@ -719,3 +1358,79 @@ class Submission(models.Model):
         default=False, verbose_name=_('sending'),
         db_index=True, editable=False
     )
+
+    priority = models.PositiveSmallIntegerField(
+        default=PRIORITY_NORMAL, choices=PRIORITY_CHOICES,
+        verbose_name=_('priority'),
+        help_text=_('Submissions with a higher priority are sent faster '
+                    'when several submissions are being sent at once.')
+    )
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """ Update newsletter counters for deleted subscriptions. """
+
+    update_counts((
+        instance.newsletter_id,
+        get_count_field(instance.subscribed, instance.unsubscribed)
+    ), None)
+
+
+@receiver(post_save, sender=Newsletter)
+def newsletter_saved(sender, **kwargs):
+    """ Saving newsletters might affect the templates to use. """
+
+    clear_templates_cache()
+
+
+@receiver(post_save, sender=Newsletter)
+@receiver(post_delete, sender=Newsletter)
+@receiver(m2m_changed, sender=Newsletter.site.through)
+def newsletter_changed(sender, **kwargs):
+    """ Forget the cached visible newsletters of every site. """
+
+    cache.delete_many([
+        get_visible_cache_key(site_id)
+        for site_id in Site.objects.values_list('pk', flat=True)
+    ])
+
+
+@receiver(setting_changed)
+def templates_setting_changed(sender, setting, **kwargs):
+    if setting in ('DEBUG', 'TEMPLATES'):
+        clear_templates_cache()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_changed(sender, instance, **kwargs):
+    """
+    Mark the message of changed articles as modified, invalidating cached
+    renderings of its archived submissions.
+    """
+
+    Message.objects.filter(pk=instance.post_id).update(date_modify=now())
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def submission_changed(sender, **kwargs):
+    """ Signal submission workers to reload their queue. """
+
+    cache.set(SUBMISSION_QUEUE_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+@receiver(post_save, sender=AUTH_USER_MODEL)
+def user_saved(sender, instance, **kwargs):
+    """
+    Forget that the e-mail address of saved users does not belong to a user.
+
+    The previous address of users changing theirs never needs to be
+    forgotten, as it belonged to a user until then.
+    """
+
+    email = getattr(instance, 'email', None)
+
+    if email:
+        cache.delete(get_nouser_cache_key(email))
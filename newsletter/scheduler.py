@@ -0,0 +1,221 @@
+import logging
+logger = logging.getLogger(__name__)
+
+import heapq
+import itertools
+import time
+
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from .models import (
+    Submission, SUBMISSION_QUEUE_CACHE_KEY, SUBMIT_BATCH_SIZE
+)
+
+
+class SubmissionScheduler(object):
+    """
+    Queue of prepared submissions, ordered by publication date, for a
+    long-running worker submitting them as soon as they are due.
+
+    Submissions being sent are interleaved batch by batch using stride
+    scheduling: every submission gets a share of the batches proportional
+    to the weight of its priority, so small or urgent submissions aren't
+    held up by large ones.
+
+    The queue is loaded from the database and only reloaded when saved or
+    deleted submissions have changed the queue's cache key, or after
+    `resync_interval` seconds; changes bypassing the Submission model and
+    process local caches are only noticed by the latter.
+    """
+
+    # Relative share of batches sent for submissions of each priority
+    weights = {
+        Submission.PRIORITY_LOW: 1,
+        Submission.PRIORITY_NORMAL: 4,
+        Submission.PRIORITY_HIGH: 16,
+    }
+
+    # Distance travelled by a submission of weight 1 per batch
+    stride = 1.0
+
+    def __init__(self, poll_interval=5, resync_interval=5 * 60,
+                 batch_size=SUBMIT_BATCH_SIZE):
+        # Maximum number of seconds between checks for changes
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+
+        # Heap of (publish_date, pk) for all unsent submissions
+        self.queue = []
+
+        self.version = None
+        self.synced = None
+
+        self.batch_size = batch_size
+
+        # Heap of (pass, sequence, submission, batches) for submissions
+        # being sent; the submission with the lowest pass sends next.
+        self.active = []
+        self.current_pass = 0.0
+        self.sequence = itertools.count()
+
+        # Primary keys of submissions which failed, not to be retried by
+        # this scheduler as their recipients would get messages twice
+        self.failed = set()
+
+    def sync(self):
+        """ (Re)load the queue of unsent submissions. """
+
+        self.version = cache.get(SUBMISSION_QUEUE_CACHE_KEY)
+        self.synced = time.time()
+
+        self.queue = list(Submission.objects.filter(
+            prepared=True, sent=False, sending=False,
+            publish_date__isnull=False
+        ).values_list('publish_date', 'pk'))
+
+        heapq.heapify(self.queue)
+
+        logger.debug('Loaded %d queued submissions.', len(self.queue))
+
+    def needs_sync(self):
+        """ Whether or not the queue might be out of date. """
+
+        if self.synced is None:
+            return True
+
+        if time.time() - self.synced >= self.resync_interval:
+            return True
+
+        return cache.get(SUBMISSION_QUEUE_CACHE_KEY) != self.version
+
+    def pop_due(self):
+        """ Remove and return the primary keys of submissions now due. """
+
+        due = []
+        current = now()
+
+        while self.queue and self.queue[0][0] < current:
+            due.append(heapq.heappop(self.queue)[1])
+
+        return due
+
+    def get_timeout(self):
+        """
+        Return the number of seconds to sleep until the next submission is
+        due or the queue should be checked for changes.
+        """
+
+        timeout = self.poll_interval
+
+        if self.queue:
+            until_due = (self.queue[0][0] - now()).total_seconds()
+            timeout = max(0, min(timeout, until_due))
+
+        return timeout
+
+    def start_due(self):
+        """
+        Start sending all due submissions, claiming each of them so it isn't
+        submitted by other workers as well.
+        """
+
+        if self.needs_sync():
+            self.sync()
+
+        due = [pk for pk in self.pop_due() if pk not in self.failed]
+
+        if not due:
+            return
+
+        for submission in Submission.objects.filter(pk__in=due).order_by(
+            '-priority', 'publish_date', 'pk'
+        ):
+            if submission.claim():
+                self.start(submission)
+
+    def start(self, submission):
+        """
+        Add `submission` to the submissions being sent. It starts at the
+        current pass, so it neither has to catch up with nor gets ahead of
+        submissions which have been sending for a while.
+        """
+
+        batches = submission.submit_batches(self.batch_size)
+
+        heapq.heappush(self.active, (
+            self.current_pass, next(self.sequence), submission, batches
+        ))
+
+    def step(self):
+        """
+        Send the next batch of the submission with the lowest pass. Returns
+        whether or not that submission has been completed.
+
+        Submissions failing with an error are logged and dropped, leaving
+        the other submissions being sent alone.
+        """
+
+        current_pass, sequence, submission, batches = heapq.heappop(
+            self.active
+        )
+        self.current_pass = current_pass
+
+        try:
+            next(batches)
+        except StopIteration:
+            return True
+        except Exception:
+            logger.exception('Submitting %s failed.', submission)
+
+            # Resets the sending flag, unless the error already did
+            batches.close()
+
+            self.failed.add(submission.pk)
+
+            return False
+
+        weight = self.weights.get(submission.priority, 1)
+
+        heapq.heappush(self.active, (
+            current_pass + self.stride / weight, sequence, submission, batches
+        ))
+
+        return False
+
+    def run_pending(self):
+        """
+        Send all due submissions, including those becoming due meanwhile,
+        interleaving their batches. Returns the number of submissions sent.
+        """
+
+        sent = 0
+
+        self.start_due()
+
+        while self.active:
+            if self.step():
+                sent += 1
+
+            self.start_due()
+
+        return sent
+
+    def run(self):
+        """ Submit submissions when they are due, forever. """
+
+        while True:
+            # Nothing else closes connections outside of requests, so drop
+            # broken ones and those exceeding CONN_MAX_AGE.
+            close_old_connections()
+
+            try:
+                self.run_pending()
+            except Exception:
+                # Keep going, i.e. when the database is unavailable for a bit
+                logger.exception('Error while running pending submissions.')
+
+                close_old_connections()
+
+            time.sleep(self.get_timeout())
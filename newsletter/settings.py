@@ -2,6 +2,9 @@ from importlib import import_module
 
 from django.conf import settings as django_settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
 
 from .utils import Singleton
 
@@ -21,6 +24,9 @@ class Settings(object):
 
     If a setting has not been explicitly defined in Django's settings, defaults
     can be specified as `DEFAULT_SETTING_NAME` class variable or property.
+
+    Resolved settings are stored on the instance, so subsequent lookups are
+    plain attribute lookups. Use `clear()` to resolve them again.
     """
 
     __metaclass__ = Singleton
@@ -51,6 +57,8 @@ class Settings(object):
                 else:
                     raise
 
+            self.__dict__[attr] = setting
+
             return setting
 
         else:
@@ -59,6 +67,10 @@ class Settings(object):
                 'No setting or default available for \'%s\'' % attr
             )
 
+    def clear(self):
+        """ Forget all resolved settings. """
+        self.__dict__.clear()
+
 
 class NewsletterSettings(Settings):
     """ Django-newsletter specific settings. """
@@ -66,6 +78,26 @@ class NewsletterSettings(Settings):
 
     DEFAULT_CONFIRM_EMAIL = True
 
+    # Queue activation emails to be sent by the send_activation_emails job
+    DEFAULT_ACTIVATION_EMAIL_OUTBOX = False
+
+    # Maximum number of subscribe, unsubscribe and update requests per IP
+    # address and per e-mail address, as (requests, seconds), i.e. (10, 3600)
+    DEFAULT_THROTTLE_IP_RATE = None
+    DEFAULT_THROTTLE_EMAIL_RATE = None
+
+    # Seconds rendered archived messages are cached for
+    DEFAULT_ARCHIVE_CACHE_TIMEOUT = 60 * 60
+
+    # Cache-Control directives for public pages, i.e. {'max_age': 300}
+    DEFAULT_CACHE_CONTROL = None
+
+    # Seconds an e-mail address is remembered not to belong to any user
+    DEFAULT_NOUSER_CACHE_TIMEOUT = 60 * 60
+
+    # Seconds the visible newsletters of a site are cached for
+    DEFAULT_LIST_CACHE_TIMEOUT = 60 * 60
+
     @property
     def DEFAULT_CONFIRM_EMAIL_SUBSCRIBE(self):
         return self.CONFIRM_EMAIL
@@ -78,7 +110,7 @@ class NewsletterSettings(Settings):
     def DEFAULT_CONFIRM_EMAIL_UPDATE(self):
         return self.CONFIRM_EMAIL
 
-    @property
+    @cached_property
     def RICHTEXT_WIDGET(self):
         # Import and set the richtext field
         NEWSLETTER_RICHTEXT_WIDGET = getattr(
@@ -103,3 +135,9 @@ class NewsletterSettings(Settings):
         return None
 
 newsletter_settings = NewsletterSettings()
+
+
+@receiver(setting_changed)
+def newsletter_setting_changed(sender, setting, **kwargs):
+    if setting.startswith('%s_' % newsletter_settings.settings_prefix):
+        newsletter_settings.clear()
@@ -0,0 +1,12 @@
+var SubmissionRecipients = {
+    init: function(inputname) {
+        inp = document.getElementById(inputname);
+        addEvent(inp, "change", function(e) { SubmissionRecipients.clearSubscriptions(); });
+    },
+
+    clearSubscriptions: function() {
+        // Selected subscriptions belong to the newsletter of the previous
+        // message; subscribers of the newsletter are looked up when sending.
+        document.getElementById('id_subscriptions').value = "";
+    }
+};
@@ -4,7 +4,7 @@ from .views import (
     NewsletterListView, NewsletterDetailView,
     SubmissionArchiveIndexView, SubmissionArchiveDetailView,
     SubscribeRequestView, UnsubscribeRequestView, UpdateRequestView,
-    ActionTemplateView, UpdateSubscriptionView,
+    ActionTemplateView, UpdateSubscriptionView, OneClickUnsubscribeView,
 )
 
 urlpatterns = [
@@ -41,6 +41,11 @@ urlpatterns = [
         UnsubscribeRequestView.as_view(confirm=True),
         name='newsletter_unsubscribe_confirm'
     ),
+    surl(
+        '^<newsletter_slug:s>/unsubscribe/one-click/<token:s>/$',
+        OneClickUnsubscribeView.as_view(),
+        name='newsletter_unsubscribe_one_click'
+    ),
 
     # Activation email sent view
     surl(
@@ -1,14 +1,23 @@
 """ Generic helper functions """
 
+import binascii
 import logging
+import math
+import os
+import re
+import struct
+import time
 
-import random
-
-from datetime import datetime
-from hashlib import sha1
+from hashlib import md5
 
 from django.contrib.sites.models import Site
-from django.utils.encoding import force_bytes
+from django.core.cache import cache
+from django.core.urlresolvers import get_script_prefix, get_urlconf, reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_bytes, force_str, force_text
+from django.utils.http import RFC3986_SUBDELIMS
+from django.utils.six.moves.urllib.parse import quote
+from django.utils.translation import get_language
 
 
 logger = logging.getLogger(__name__)
@@ -17,16 +26,58 @@ logger = logging.getLogger(__name__)
 # Possible actions that user can perform
 ACTIONS = ('subscribe', 'unsubscribe', 'update')
 
+# Random bytes in activation codes, which are stored as 40 hex digits
+ACTIVATION_CODE_BYTES = 20
+
+try:
+    from secrets import token_hex
+except ImportError:
+    # Python < 3.6
+    def token_hex(nbytes):
+        return force_text(binascii.hexlify(os.urandom(nbytes)))
+
 
 def make_activation_code():
     """ Generate a unique activation code. """
-    random_string = str(random.random())
-    random_digest = sha1(force_bytes(random_string)).hexdigest()[:5]
-    time_string = str(datetime.now().microsecond)
+    return token_hex(ACTIVATION_CODE_BYTES)
+
+
+def make_activation_codes(count):
+    """
+    Generate `count` unique activation codes, reading the random bytes for
+    all of them at once.
+    """
+    codes = force_text(
+        binascii.hexlify(os.urandom(ACTIVATION_CODE_BYTES * count))
+    )
+
+    length = ACTIVATION_CODE_BYTES * 2
+
+    return [
+        codes[start:start + length] for start in range(0, len(codes), length)
+    ]
+
+
+def make_token(value, salt):
+    """
+    Return a token containing `value` (i.e. a primary key), signed with
+    the SECRET_KEY and `salt`.
+    """
+    value = force_text(value)
+
+    return u'%s-%s' % (value, salted_hmac(salt, value).hexdigest())
+
+
+def check_token(token, salt):
+    """ Return the value of a valid token, or None for invalid tokens. """
+    token = force_text(token)
+
+    value, sep, signature = token.rpartition('-')
 
-    combined_string = random_digest + time_string
+    if sep and constant_time_compare(make_token(value, salt), token):
+        return value
 
-    return sha1(force_bytes(combined_string)).hexdigest()
+    return None
 
 
 def get_default_sites():
@@ -34,6 +85,148 @@ def get_default_sites():
     return [site.id for site in Site.objects.all()]
 
 
+def is_rate_limited(scope, value, rate):
+    """
+    Count a request for `value` (i.e. an IP address) within `scope` and
+    return whether it exceeds `rate`, a (number of requests, seconds) tuple.
+
+    Requests are counted in fixed windows in the default cache, so limits
+    are shared between processes when the cache is.
+    """
+    limit, window = rate
+
+    key = 'newsletter_rate_%s_%s_%d' % (
+        scope, md5(force_bytes(value)).hexdigest(), time.time() // window
+    )
+
+    # Initialize the counter if it doesn't exist yet
+    cache.add(key, 0, window)
+
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # The counter expired in between
+        cache.set(key, 1, window)
+        count = 1
+
+    return count > limit
+
+
+def get_retry_after(rate):
+    """
+    Return the number of seconds until the current window of `rate` ends,
+    after which requests are counted anew.
+    """
+    window = rate[1]
+
+    return int(math.ceil(window - time.time() % window))
+
+
+class URLTemplate(object):
+    """
+    Build URL's for a named URL pattern through string formatting, instead
+    of resolving the pattern for every URL like `reverse()` does.
+
+    The pattern is reversed once (per URLconf, script prefix and language)
+    with placeholders for the keyword arguments in `names`, the other keyword
+    arguments are fixed. Values are quoted like `reverse()` does but, unlike
+    with `reverse()`, they are not validated against the pattern.
+    """
+
+    # Characters reverse() leaves unquoted
+    safe = RFC3986_SUBDELIMS + str('/~:@')
+    safe_re = re.compile(r'[-A-Za-z0-9_.%s]*\Z' % re.escape(safe))
+
+    def __init__(self, viewname, names, **kwargs):
+        self.viewname = viewname
+        self.names = names
+        self.kwargs = kwargs
+
+        self.templates = {}
+
+    def get_template(self):
+        key = (get_urlconf(), get_script_prefix(), get_language())
+
+        try:
+            return self.templates[key]
+        except KeyError:
+            pass
+
+        # Placeholders should be valid for about any pattern
+        placeholders = dict(
+            (name, 'urltemplate%s' % name.replace('_', ''))
+            for name in self.names
+        )
+
+        kwargs = dict(self.kwargs, **placeholders)
+        template = reverse(self.viewname, kwargs=kwargs).replace('%', '%%')
+
+        # Longest first, in case of placeholders containing others
+        for name in sorted(self.names, key=len, reverse=True):
+            template = template.replace(
+                placeholders[name], '%%(%s)s' % name
+            )
+
+        self.templates[key] = template
+
+        return template
+
+    def quote(self, value):
+        """ Equivalent to, but faster than, django.utils.http.urlquote(). """
+
+        value = force_text(value)
+
+        # Quoting is relatively expensive and mostly not required at all
+        if self.safe_re.match(value):
+            return value
+
+        return force_text(quote(force_str(value), self.safe))
+
+    def __call__(self, **kwargs):
+        """ Return the URL for the given values of the placeholders. """
+
+        return self.get_template() % dict(
+            (name, self.quote(kwargs[name])) for name in self.names
+        )
+
+
+class BloomFilter(object):
+    """
+    Compact, probabilistic set of strings. Membership tests give false
+    positives at about `error_rate`, but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+
+        # Optimal number of bits and hash functions for the error rate
+        self.size = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        self.hashes = max(1, int(round(
+            float(self.size) / capacity * math.log(2)
+        )))
+
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def get_positions(self, value):
+        """ Bit positions for `value`, derived from a single digest. """
+
+        h1, h2 = struct.unpack('<QQ', md5(force_bytes(value)).digest())
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.get_positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.get_positions(value)
+        )
+
+
 class Singleton(type):
     """
     Singleton metaclass.
@@ -1,12 +1,55 @@
+import hashlib
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.forms.utils import ValidationError
+from django.utils.encoding import force_bytes
 from django.utils.translation import ugettext_lazy as _
 
+from .settings import newsletter_settings
+
+
+# Number of e-mail addresses checked against the user table per query
+USER_EMAIL_CHUNK_SIZE = 500
+
+
+def get_nouser_cache_key(email):
+    """ Cache key marking `email` as not belonging to any user. """
+    return 'newsletter_nouser_%s' % hashlib.md5(force_bytes(email)).hexdigest()
+
+
+def get_user_emails(emails, chunk_size=USER_EMAIL_CHUNK_SIZE):
+    """
+    Return the set of e-mail addresses in `emails` which belong to an
+    existing user, querying the user table once per chunk of addresses.
+    """
+    User = get_user_model()
+
+    emails = list(emails)
+    user_emails = set()
+
+    for start in range(0, len(emails), chunk_size):
+        user_emails.update(
+            User.objects.filter(
+                email__in=emails[start:start + chunk_size]
+            ).values_list('email', flat=True)
+        )
+
+    return user_emails
+
 
 def validate_email_nouser(email):
     """
     Check if the email address does not belong to an existing user.
+
+    Addresses found not to belong to a user are remembered in the cache,
+    until a user with that address is saved.
     """
+    cache_key = get_nouser_cache_key(email)
+
+    if cache.get(cache_key):
+        return
+
     # Check whether we should be subscribed to as a user
     User = get_user_model()
 
@@ -16,3 +59,5 @@ def validate_email_nouser(email):
             "account on this site. Please log in as that user "
             "and try again."
         ) % {'email': email})
+
+    cache.set(cache_key, True, newsletter_settings.NOUSER_CACHE_TIMEOUT)
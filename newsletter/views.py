@@ -1,6 +1,7 @@
 import logging
 
 import datetime
+import hashlib
 import socket
 
 from smtplib import SMTPException
@@ -8,40 +9,108 @@ from smtplib import SMTPException
 from django.core.exceptions import ValidationError, ImproperlyConfigured
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max
 
+from django.template.loader import render_to_string
 from django.template.response import SimpleTemplateResponse
 
 from django.shortcuts import get_object_or_404, redirect
-from django.http import Http404
+from django.http import Http404, HttpResponse
 
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.views.generic import (
-    ListView, DetailView,
+    View, ListView, DetailView,
     ArchiveIndexView, DateDetailView,
     TemplateView, FormView
 )
 
 from django.contrib import messages
-from django.contrib.sites.models import Site
 from django.contrib.auth.decorators import login_required
 
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.encoding import force_bytes
 from django.utils.translation import ugettext, ugettext_lazy as _
 from django.utils import timezone
 
 from django.forms.models import modelformset_factory
 
-from .models import Newsletter, Subscription, Submission
+from .models import (
+    Newsletter, Subscription, Submission, UNSUBSCRIBE_TOKEN_SALT
+)
 from .forms import (
     SubscribeRequestForm, UserUpdateForm, UpdateRequestForm,
     UnsubscribeRequestForm, UpdateForm
 )
 from .settings import newsletter_settings
-from .utils import ACTIONS
+from .utils import ACTIONS, check_token, get_retry_after, is_rate_limited
 
 
 logger = logging.getLogger(__name__)
 
 
+# Newsletter fields affecting the rendering of public pages
+NEWSLETTER_VALIDATOR_FIELDS = (
+    'pk', 'title', 'slug', 'email', 'sender', 'visible', 'send_html'
+)
+
+
+def make_etag(*values):
+    """ Return an ETag for the given values. """
+    return hashlib.md5(force_bytes(repr(values))).hexdigest()
+
+
+def get_newsletter_values(newsletter):
+    """ Return the values of NEWSLETTER_VALIDATOR_FIELDS for `newsletter`. """
+    return tuple(
+        getattr(newsletter, field) for field in NEWSLETTER_VALIDATOR_FIELDS
+    )
+
+
+class ConditionalGetMixin(object):
+    """
+    Answer conditional GET requests based on validators which are cheap to
+    compute, before rendering anything, and add the configured Cache-Control
+    directives to responses.
+    """
+
+    def get_validators(self):
+        """
+        Return a (etag, last_modified) tuple, either of which may be None
+        if not available. Returning None disables conditional responses.
+        """
+        raise NotImplementedError
+
+    def render_get(self, request, *args, **kwargs):
+        """ Return the response for an unconditional request. """
+        return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+
+        if validators is None:
+            return self.render_get(request, *args, **kwargs)
+
+        etag, last_modified = validators
+
+        @condition(
+            etag_func=lambda request, *args, **kwargs: etag,
+            last_modified_func=lambda request, *args, **kwargs: last_modified
+        )
+        def conditional_get(request, *args, **kwargs):
+            return self.render_get(request, *args, **kwargs)
+
+        response = conditional_get(request, *args, **kwargs)
+
+        if newsletter_settings.CACHE_CONTROL:
+            patch_cache_control(response, **newsletter_settings.CACHE_CONTROL)
+
+        return response
+
+
 class NewsletterViewBase(object):
     """ Base class for newsletter views. """
     queryset = Newsletter.on_site.filter(visible=True)
@@ -49,15 +118,45 @@ class NewsletterViewBase(object):
     slug_url_kwarg = 'newsletter_slug'
 
 
-class NewsletterDetailView(NewsletterViewBase, DetailView):
-    pass
+class NewsletterDetailView(ConditionalGetMixin, NewsletterViewBase,
+                           DetailView):
+    def get_validators(self):
+        self.object = self.get_object()
+
+        # Links differ for logged in users, which are not validated
+        if self.request.user.is_authenticated():
+            return None
+
+        return make_etag(get_newsletter_values(self.object)), None
+
+    def render_get(self, request, *args, **kwargs):
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
 
-class NewsletterListView(NewsletterViewBase, ListView):
+class NewsletterListView(ConditionalGetMixin, NewsletterViewBase, ListView):
     """
     List available newsletters and generate a formset for (un)subscription
     for authenticated users.
     """
+    template_name = 'newsletter/newsletter_list.html'
+    context_object_name = 'newsletter_list'
+
+    def get_queryset(self):
+        # The visible newsletters are cached, rather than queried every time
+        return Newsletter.get_visible()
+
+    def get_validators(self):
+        # The formset for logged in users is not cacheable
+        if self.request.user.is_authenticated():
+            return None
+
+        values = [
+            get_newsletter_values(newsletter)
+            for newsletter in self.get_queryset()
+        ]
+
+        return make_etag(*values), None
 
     def post(self, request, **kwargs):
         """ Allow post requests. """
@@ -80,7 +179,6 @@ class NewsletterListView(NewsletterViewBase, ListView):
         """
 
         # Short-hand variable names
-        newsletters = self.get_queryset()
         request = self.request
         user = request.user
 
@@ -88,18 +186,26 @@ class NewsletterListView(NewsletterViewBase, ListView):
             Subscription, form=UserUpdateForm, extra=0
         )
 
-        # Before rendering the formset, subscription objects should
-        # already exist.
-        for n in newsletters:
-            Subscription.objects.get_or_create(
-                newsletter=n, user=user
-            )
+        # The newsletters have already been fetched by ListView.get()
+        newsletter_ids = [n.pk for n in self.object_list]
 
         # Get all subscriptions for use in the formset
         qs = Subscription.objects.filter(
-            newsletter__in=newsletters, user=user
+            newsletter__in=newsletter_ids, user=user
+        ).select_related('newsletter').order_by('pk')
+
+        # Before rendering the formset, subscription objects should
+        # already exist.
+        missing_ids = set(newsletter_ids).difference(
+            subscription.newsletter_id for subscription in qs
         )
 
+        if missing_ids:
+            self.create_subscriptions(missing_ids)
+
+            # Start over with the complete set of subscriptions
+            qs = qs.all()
+
         if request.method == 'POST':
             try:
                 formset = SubscriptionFormSet(request.POST, queryset=qs)
@@ -133,6 +239,25 @@ class NewsletterListView(NewsletterViewBase, ListView):
 
         return formset
 
+    def create_subscriptions(self, newsletter_ids):
+        """
+        Create (unactivated) subscriptions of the current user to the
+        newsletters with the given id's.
+        """
+
+        with transaction.atomic():
+            Subscription.objects.bulk_create([
+                Subscription(
+                    newsletter_id=newsletter_id, user=self.request.user
+                )
+                for newsletter_id in newsletter_ids
+            ])
+
+            # bulk_create() bypasses save(), so update the counters here
+            Newsletter.objects.filter(pk__in=newsletter_ids).update(
+                unactivated_count=F('unactivated_count') + 1
+            )
+
 
 class ProcessUrlDataMixin(object):
     """
@@ -389,6 +514,50 @@ class ActionRequestView(ActionFormView):
         """ Return subscription for the current request. """
         return form.instance
 
+    def dispatch(self, request, *args, **kwargs):
+        """ Throttle requests before doing any work, i.e. queries. """
+
+        if request.method == 'POST':
+            rate = self.get_throttle_rate()
+            if rate:
+                return self.throttled(rate)
+
+        return super(ActionRequestView, self).dispatch(
+            request, *args, **kwargs
+        )
+
+    def get_throttle_rate(self):
+        """
+        Count the current request and return the rate exceeded by it, if any.
+        """
+
+        checks = (
+            ('ip', self.request.META.get('REMOTE_ADDR'),
+                newsletter_settings.THROTTLE_IP_RATE),
+            ('email', self.request.POST.get('email_field', '').lower(),
+                newsletter_settings.THROTTLE_EMAIL_RATE),
+        )
+
+        for scope, value, rate in checks:
+            if rate and value and is_rate_limited(scope, value, rate):
+                logger.warning(
+                    'Throttled %s request for %s %s.',
+                    self.action, scope, value, extra={'request': self.request}
+                )
+
+                return rate
+
+        return None
+
+    def throttled(self, rate):
+        response = HttpResponse(
+            ugettext('Too many requests, please try again later.'),
+            content_type='text/plain', status=429
+        )
+        response['Retry-After'] = get_retry_after(rate)
+
+        return response
+
     def no_email_confirm(self, form):
         """
         Subscribe/unsubscribe user and redirect to action activated page.
@@ -413,7 +582,7 @@ class ActionRequestView(ActionFormView):
             return self.no_email_confirm(form)
 
         try:
-            self.subscription.send_activation_email(action=self.action)
+            self.subscription.queue_activation_email(action=self.action)
 
         except (SMTPException, socket.error) as e:
             logger.exception(
@@ -528,6 +697,57 @@ class UpdateSubscriptionView(ActionFormView):
         return super(UpdateSubscriptionView, self).form_valid(form)
 
 
+class OneClickUnsubscribeView(View):
+    """
+    Unsubscribe through a signed link, without confirmation email (RFC 8058).
+
+    Mail clients POST to the link directly, while GET requests (which might
+    come from link scanners) only render a form to POST. No session or other
+    state is used.
+    """
+    template_name = 'newsletter/subscription_unsubscribe_one_click.html'
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        self.subscription_id = check_token(
+            kwargs['token'], UNSUBSCRIBE_TOKEN_SALT
+        )
+
+        if not self.subscription_id or not self.subscription_id.isdigit():
+            raise Http404(ugettext('Invalid unsubscribe link.'))
+
+        # The subscription has to belong to the newsletter in the link
+        self.newsletter = get_object_or_404(
+            Newsletter, slug=kwargs['newsletter_slug'],
+            subscription__pk=self.subscription_id
+        )
+
+        return super(OneClickUnsubscribeView, self).dispatch(
+            request, *args, **kwargs
+        )
+
+    def render(self, **context):
+        """ Render the template with newsletter and action in context. """
+        context.update({
+            'newsletter': self.newsletter,
+            'action': 'unsubscribe'
+        })
+
+        return HttpResponse(render_to_string(self.template_name, context))
+
+    def get(self, request, newsletter_slug, token):
+        return self.render()
+
+    def post(self, request, newsletter_slug, token):
+        if Subscription.unsubscribe_by_pk(self.subscription_id):
+            logger.info(
+                'Unsubscribed subscription %s with one click.',
+                self.subscription_id
+            )
+
+        return self.render(unsubscribed=True)
+
+
 class SubmissionViewBase(NewsletterMixin):
     """ Base class for submission archive views. """
     date_field = 'publish_date'
@@ -543,7 +763,7 @@ class SubmissionViewBase(NewsletterMixin):
     def process_url_data(self, *args, **kwargs):
         """ Use only visible newsletters. """
 
-        kwargs['newsletter_queryset'] = NewsletterListView().get_queryset()
+        kwargs['newsletter_queryset'] = NewsletterViewBase.queryset.all()
         return super(
             SubmissionViewBase, self).process_url_data(*args, **kwargs)
 
@@ -553,6 +773,9 @@ class SubmissionViewBase(NewsletterMixin):
 
         qs = qs.filter(newsletter=self.newsletter)
 
+        # Required for the absolute URL of submissions
+        qs = qs.select_related('message', 'newsletter')
+
         return qs
 
     def _make_date_lookup_arg(self, value):
@@ -571,11 +794,75 @@ class SubmissionViewBase(NewsletterMixin):
         return value
 
 
-class SubmissionArchiveIndexView(SubmissionViewBase, ArchiveIndexView):
-    pass
+class SubmissionArchiveIndexView(ConditionalGetMixin, SubmissionViewBase,
+                                 ArchiveIndexView):
+    def get_validators(self):
+        """
+        Validate on the newsletter and the number and modification dates of
+        the submissions listed, in a single query.
+        """
+        submissions = self.get_dated_queryset()
+
+        dates = submissions.aggregate(
+            count=Count('pk'),
+            publish_date=Max('publish_date'),
+            date_modify=Max('message__date_modify')
+        )
+
+        if dates['count']:
+            last_modified = max(dates['publish_date'], dates['date_modify'])
+        else:
+            last_modified = None
+
+        return make_etag(
+            get_newsletter_values(self.newsletter), sorted(dates.items())
+        ), last_modified
+
+
+class SubmissionArchiveDetailView(ConditionalGetMixin, SubmissionViewBase,
+                                  DateDetailView):
+    def get_validators(self):
+        self.object = self.get_object()
+
+        last_modified = max(
+            self.object.message.date_modify, self.object.publish_date
+        )
 
+        return make_etag(self.get_cache_key()), last_modified
+
+    def render_get(self, request, *args, **kwargs):
+        """ Serve the rendered message from the cache when available. """
+
+        cache_key = self.get_cache_key()
+        content = cache.get(cache_key)
+
+        if content is not None:
+            return HttpResponse(content)
+
+        context = self.get_context_data(object=self.object)
+        response = self.render_to_response(context)
+        response.render()
+
+        cache.set(
+            cache_key, response.content,
+            newsletter_settings.ARCHIVE_CACHE_TIMEOUT
+        )
+
+        return response
+
+    def get_cache_key(self):
+        """
+        Cache key for the rendered submission, changing whenever its message
+        (or one of its articles) or the newsletter is modified.
+        """
+        return 'newsletter_archive_%d_%s' % (
+            self.object.pk, make_etag(
+                self.object.message.date_modify,
+                self.object.publish_date,
+                get_newsletter_values(self.object.newsletter)
+            )
+        )
 
-class SubmissionArchiveDetailView(SubmissionViewBase, DateDetailView):
     def get_context_data(self, **kwargs):
         """
         Make sure the actual message is available.
@@ -583,15 +870,7 @@ class SubmissionArchiveDetailView(SubmissionViewBase, DateDetailView):
         context = \
             super(SubmissionArchiveDetailView, self).get_context_data(**kwargs)
 
-        message = self.object.message
-
-        context.update({
-            'message': message,
-            'site': Site.objects.get_current(),
-            'date': self.object.publish_date,
-            'STATIC_URL': settings.STATIC_URL,
-            'MEDIA_URL': settings.MEDIA_URL
-        })
+        context.update(self.object.render_context)
 
         return context
 
@@ -1,14 +1,19 @@
+import json
 import os
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
-from django.test.utils import patch_logger
+from django.test.utils import CaptureQueriesContext, patch_logger
 
 from newsletter import admin  # Triggers model admin registration
 from newsletter.admin_utils import make_subscription
-from newsletter.models import Message, Newsletter, Submission, Subscription
+from newsletter.models import (
+    Message, Newsletter, Submission, Subscription, Suppression
+)
 
 test_files_dir = os.path.join(os.path.dirname(__file__), 'files')
 
@@ -33,7 +38,8 @@ class AdminTestMixin(object):
 
 
 class AdminTestCase(AdminTestMixin, TestCase):
-    def admin_import_file(self, source_file, ignore_errors=''):
+    def admin_import_file(self, source_file, ignore_errors='', encoding='',
+                          dry_run=''):
         """ Upload an address file for import to admin. """
 
         import_url = reverse('admin:newsletter_subscription_import')
@@ -43,6 +49,8 @@ class AdminTestCase(AdminTestMixin, TestCase):
                 'newsletter': self.newsletter.pk,
                 'address_file': fh,
                 'ignore_errors': ignore_errors,
+                'encoding': encoding,
+                'dry_run': dry_run,
             }, follow=True)
 
     def admin_import_subscribers(self, source_file, ignore_errors=''):
@@ -124,6 +132,12 @@ class AdminTestCase(AdminTestMixin, TestCase):
         })
         self.assertTrue(Subscription.objects.get(name_field='Khaled').subscribed)
 
+        # Counters are recalculated after bulk updates
+        newsletter = Newsletter.objects.get(pk=self.newsletter.pk)
+        self.assertEqual(newsletter.subscribed_count, 2)
+        self.assertEqual(newsletter.unsubscribed_count, 1)
+        self.assertEqual(newsletter.unactivated_count, 0)
+
         response = self.client.post(changelist_url, data={
             'index': 0,
             'action': ['make_unsubscribed'],
@@ -131,6 +145,63 @@ class AdminTestCase(AdminTestMixin, TestCase):
         })
         self.assertFalse(Subscription.objects.get(name_field='Sara').subscribed)
 
+    def assertChangelistQueriesConstant(self, changelist_url, add_objects):
+        """
+        Assert the number of queries for a changelist doesn't depend on the
+        number of objects displayed, `add_objects` adding more of them.
+        """
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(changelist_url)
+            self.assertEqual(response.status_code, 200)
+
+            return len(queries)
+
+        add_objects(1)
+        few_queries = count_queries()
+
+        add_objects(10)
+        self.assertEqual(count_queries(), few_queries)
+
+    def test_changelist_queries(self):
+        """ Changelists don't perform queries for every row displayed. """
+
+        User = get_user_model()
+
+        def add_subscriptions(count):
+            for index in range(count):
+                user = User.objects.create_user(
+                    'user%d' % User.objects.count(), 'user@example.org'
+                )
+                Subscription.objects.create(
+                    newsletter=self.newsletter, user=user, subscribed=True
+                )
+                Subscription.objects.create(
+                    newsletter=self.newsletter, subscribed=True,
+                    email_field='%s@example.org' % user.username
+                )
+
+        self.assertChangelistQueriesConstant(
+            reverse('admin:newsletter_subscription_changelist'),
+            add_subscriptions
+        )
+
+        def add_messages(count):
+            for index in range(count):
+                message = Message.objects.create(
+                    newsletter=self.newsletter, title='Message',
+                    slug='message-%d' % Message.objects.count()
+                )
+                Submission.from_message(message)
+
+        self.assertChangelistQueriesConstant(
+            reverse('admin:newsletter_message_changelist'), add_messages
+        )
+        self.assertChangelistQueriesConstant(
+            reverse('admin:newsletter_submission_changelist'), add_messages
+        )
+
     def test_admin_import_get_form(self):
         """ Test Import form. """
 
@@ -147,6 +218,27 @@ class AdminTestCase(AdminTestMixin, TestCase):
         )
         self.assertEqual(self.newsletter.subscription_set.count(), 2)
 
+    def test_admin_import_subscribers_bulk(self):
+        """ Imported subscriptions are active and have unique codes. """
+
+        response = self.admin_import_subscribers('addresses.csv')
+
+        self.assertContains(
+            response,
+            "2 subscriptions have been successfully added."
+        )
+
+        subscriptions = self.newsletter.subscription_set.all()
+        self.assertTrue(all(
+            s.subscribed and s.subscribe_date for s in subscriptions
+        ))
+
+        activation_codes = set(s.activation_code for s in subscriptions)
+        self.assertEqual(len(activation_codes), 2)
+
+        newsletter = Newsletter.objects.get(pk=self.newsletter.pk)
+        self.assertEqual(newsletter.subscribed_count, 2)
+
     def test_admin_import_subscribers_ldif(self):
         response = self.admin_import_subscribers('addresses.ldif')
 
@@ -165,6 +257,88 @@ class AdminTestCase(AdminTestMixin, TestCase):
         )
         self.assertEqual(self.newsletter.subscription_set.count(), 2)
 
+    def test_admin_import_subscribers_jsonl(self):
+        response = self.admin_import_subscribers('addresses.jsonl')
+
+        self.assertContains(
+            response,
+            "2 subscriptions have been successfully added."
+        )
+        self.assertEqual(self.newsletter.subscription_set.count(), 2)
+
+    def test_admin_import_subscribers_csv_gz(self):
+        response = self.admin_import_subscribers('addresses.csv.gz')
+
+        self.assertContains(
+            response,
+            "2 subscriptions have been successfully added."
+        )
+        self.assertEqual(self.newsletter.subscription_set.count(), 2)
+
+    def test_admin_import_subscribers_jsonl_gz(self):
+        response = self.admin_import_subscribers('addresses.jsonl.gz')
+
+        self.assertContains(
+            response,
+            "2 subscriptions have been successfully added."
+        )
+        self.assertEqual(self.newsletter.subscription_set.count(), 2)
+
+    def test_admin_import_subscribers_invalid_gz(self):
+        """ Uncompressed files with a .gz extension yield an error. """
+
+        import_url = reverse('admin:newsletter_subscription_import')
+
+        with open(os.path.join(test_files_dir, 'addresses.csv'), 'rb') as fh:
+            response = self.client.post(import_url, {
+                'newsletter': self.newsletter.pk,
+                'address_file': SimpleUploadedFile(
+                    'addresses.csv.gz', fh.read(), 'application/gzip'
+                ),
+            })
+
+        self.assertContains(response, "Error reading compressed file")
+
+    def test_admin_import_subscribers_encoding(self):
+        """ Test overriding the detected encoding of an address file. """
+
+        response = self.admin_import_file(
+            'addresses_latin1.csv', encoding='latin-1'
+        )
+        self.assertContains(response, "<h1>Confirm import</h1>")
+        self.assertContains(
+            response, u"<li>Jos\u00e9 Smith &lt;john@example.org&gt;</li>"
+        )
+
+        response = self.admin_import_file(
+            'addresses_latin1.csv', encoding='nosuchencoding'
+        )
+        self.assertContains(
+            response, "Encoding &#39;nosuchencoding&#39; was not recognized."
+        )
+
+    def test_admin_import_subscribers_detected_encoding(self):
+        """ Test showing the detected encoding of an address file. """
+
+        response = self.admin_import_file('addresses.csv', dry_run='true')
+        self.assertContains(response, "The file has been read as utf-8.")
+        self.assertContains(
+            response,
+            '<input id="id_encoding" maxlength="50" name="encoding" '
+            'type="text" value="utf-8" />',
+            html=True
+        )
+
+        response = self.admin_import_file('addresses.csv')
+        self.assertContains(response, "<h1>Confirm import</h1>")
+        self.assertContains(response, "The file has been read as utf-8.")
+
+        # An explicit encoding is kept
+        response = self.admin_import_file(
+            'addresses_latin1.csv', encoding='latin-1', dry_run='true'
+        )
+        self.assertContains(response, "The file has been read as latin-1.")
+
     def test_admin_import_subscribers_duplicates(self):
         """ Test importing a file with duplicate addresses. """
 
@@ -180,6 +354,31 @@ class AdminTestCase(AdminTestMixin, TestCase):
         self.assertEqual(len(messages), 2)
         self.assertEqual(self.newsletter.subscription_set.count(), 2)
 
+    def test_admin_import_subscribers_dry_run(self):
+        """ Test reporting on an address file without importing it. """
+
+        subscription = make_subscription(self.newsletter, 'john@example.org')
+        subscription.save()
+
+        response = self.admin_import_file(
+            'addresses_duplicates.csv', dry_run='true'
+        )
+
+        self.assertContains(response, "<h2>Import report</h2>")
+        self.assertContains(
+            response, "1 entries can be imported, 3 entries would be skipped."
+        )
+        self.assertContains(
+            response, "<td>Duplicate entry</td>\n      <td>1</td>"
+        )
+        self.assertContains(
+            response, "<td>Already subscribed</td>\n      <td>2</td>"
+        )
+
+        # Nothing has been imported
+        self.assertEqual(self.newsletter.subscription_set.count(), 1)
+        self.assertNotIn('addresses', self.client.session)
+
     def test_admin_import_subscribers_existing(self):
         """ Test importing already existing subscriptions. """
 
@@ -208,6 +407,23 @@ class AdminTestCase(AdminTestMixin, TestCase):
         self.assertEqual(len(messages), 1)
         self.assertEqual(self.newsletter.subscription_set.count(), 2)
 
+    def test_admin_import_subscribers_users(self):
+        """ Addresses belonging to users are not imported. """
+
+        User = get_user_model()
+        User.objects.create_user('johnsmith', 'john@example.org')
+
+        response = self.admin_import_file(
+            'addresses_duplicates.csv', dry_run='true'
+        )
+
+        self.assertContains(
+            response, "1 entries can be imported, 3 entries would be skipped."
+        )
+        self.assertContains(
+            response, "<td>Belongs to a user account</td>\n      <td>2</td>"
+        )
+
     def test_admin_import_subscribers_permission(self):
         """
         To be able to import subscriptions, user must have the
@@ -238,6 +454,43 @@ class AdminTestCase(AdminTestMixin, TestCase):
         )
         self.assertRedirects(response, import_url)
 
+    def test_admin_export_subscribers(self):
+        """ Test streaming export of subscriptions. """
+
+        Subscription.objects.bulk_create([
+            Subscription(
+                newsletter=self.newsletter, name_field='Sara',
+                email_field='sara@example.org', subscribed=True,
+            ),
+            Subscription(
+                newsletter=self.newsletter, name_field='Bob',
+                email_field='bob@example.org', unsubscribed=True,
+            ),
+        ])
+        export_url = reverse('admin:newsletter_subscription_export')
+
+        response = self.client.get(export_url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.splitlines(), [
+            'name,email,newsletter,subscribed,unsubscribed,subscribe_date,'
+            'unsubscribe_date',
+            'Sara,sara@example.org,test-newsletter,True,False,,',
+        ])
+
+        response = self.client.get(export_url, {'format': 'jsonl', 'all': 1})
+        lines = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(
+            [json.loads(line)['email'] for line in lines.splitlines()],
+            ['sara@example.org', 'bob@example.org']
+        )
+
+        response = self.client.get(export_url, {'format': 'xls'})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(export_url, {'newsletter': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
     def test_message_admin(self):
         """
         Testing message admin change list display and message previews.
@@ -315,6 +568,45 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
             '<td class="field-admin_status_text">Not sent.</td>'
         )
 
+    def test_change_recipients(self):
+        """
+        Selected recipients are rendered as a list of primary keys, with a
+        number of queries independent of the number of subscriptions.
+        """
+
+        def get_change_form(subscription_count):
+            Subscription.objects.bulk_create([
+                Subscription(
+                    newsletter=self.newsletter, subscribed=True,
+                    email_field='test%d@example.org' % index,
+                ) for index in range(Subscription.objects.count(),
+                                     subscription_count)
+            ])
+            submission = Submission.from_message(self.message)
+            submission.recipients = Submission.RECIPIENTS_SELECTED
+            submission.save()
+            submission.subscriptions = self.newsletter.get_subscriptions()
+
+            change_url = reverse(
+                'admin:newsletter_submission_change', args=[submission.pk]
+            )
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(change_url)
+
+            return response, len(queries)
+
+        response, few_queries = get_change_form(2)
+        response, many_queries = get_change_form(20)
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertNotContains(response, 'test1@example.org')
+        self.assertContains(response, 'class="vManyToManyRawIdAdminField"')
+        self.assertContains(
+            response, ','.join(str(pk) for pk in Subscription.objects.order_by(
+                'pk').values_list('pk', flat=True))
+        )
+
     def test_duplicate_fail(self):
         """ Test that a message cannot be published twice. """
 
@@ -326,6 +618,8 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
             'publish_date_0': '2016-01-09',
             'publish_date_1': '07:24',
             'publish': 'on',
+            'recipients': Submission.RECIPIENTS_ALL,
+            'priority': Submission.PRIORITY_NORMAL,
         })
         self.assertContains(
             response,
@@ -340,6 +634,8 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
             'publish_date_0': '2016-01-09',
             'publish_date_1': '07:24',
             'publish': 'on',
+            'recipients': Submission.RECIPIENTS_ALL,
+            'priority': Submission.PRIORITY_NORMAL,
         }, follow=True)
 
         self.assertContains(response, "added")
@@ -349,6 +645,34 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
 
         self.assertEqual(submission.message, self.message)
 
+    def test_add_selected_recipients(self):
+        """ Sending to selected recipients requires selecting them. """
+
+        data = {
+            'message': self.message.pk,
+            'publish_date_0': '2016-01-09',
+            'publish_date_1': '07:24',
+            'recipients': Submission.RECIPIENTS_SELECTED,
+            'priority': Submission.PRIORITY_NORMAL,
+        }
+
+        response = self.client.post(self.add_url, data=data)
+        self.assertContains(
+            response, "Select the subscriptions to send the message to."
+        )
+
+        subscription = Subscription.objects.create(
+            newsletter=self.newsletter, subscribed=True,
+            email_field='test@example.org'
+        )
+        data['subscriptions'] = str(subscription.pk)
+
+        response = self.client.post(self.add_url, data=data, follow=True)
+        self.assertContains(response, "added")
+
+        submission = Submission.objects.get()
+        self.assertEqual(list(submission.get_recipients()), [subscription])
+
     def test_add_wrongmessage_regression(self):
         """ Regression test for #170. """
 
@@ -362,6 +686,8 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
             'publish_date_0': '2016-01-09',
             'publish_date_1': '07:24',
             'publish': 'on',
+            'recipients': Submission.RECIPIENTS_ALL,
+            'priority': Submission.PRIORITY_NORMAL,
         }, follow=True)
 
         self.assertContains(response, "added")
@@ -370,3 +696,24 @@ class SubmissionAdminTests(AdminTestMixin, TestCase):
         submission = Submission.objects.all()[0]
 
         self.assertEqual(submission.message, self.message)
+
+
+class SuppressionAdminTests(AdminTestMixin, TestCase):
+    """ Tests for Suppression admin. """
+
+    def test_add_duplicate(self):
+        """ Addresses differing in case only are reported as duplicates. """
+
+        Suppression.objects.create(email='test@example.org')
+
+        response = self.client.post(
+            reverse('admin:newsletter_suppression_add'), data={
+                'email': 'Test@Example.org',
+                'reason': Suppression.REASON_MANUAL,
+            }
+        )
+
+        self.assertContains(
+            response, 'Suppression with this E-mail already exists.'
+        )
+        self.assertEqual(Suppression.objects.count(), 1)
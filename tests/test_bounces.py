@@ -0,0 +1,132 @@
+import email
+
+from django.test import TestCase
+
+from newsletter.bounces import BounceProcessor, parse_bounce
+from newsletter.models import Subscription, Suppression, BOUNCE_HEADER
+
+from .utils import NewsletterTestMixin
+
+
+DSN = """\
+From: Mail Delivery System <MAILER-DAEMON@example.com>
+To: test@testsender.com
+Subject: Undelivered Mail Returned to Sender
+MIME-Version: 1.0
+Content-Type: multipart/report; report-type=delivery-status;
+    boundary="BOUNDARY"
+
+--BOUNDARY
+Content-Type: text/plain
+
+This is the mail system. Your message could not be delivered.
+
+--BOUNDARY
+Content-Type: message/delivery-status
+
+Reporting-MTA: dns; mail.example.com
+
+Final-Recipient: rfc822; %(recipient)s
+Action: %(action)s
+Status: %(status)s
+
+--BOUNDARY
+Content-Type: text/rfc822-headers
+
+From: Test Sender <test@testsender.com>
+To: %(recipient)s
+Subject: Test message
+%(header)s: %(token)s
+
+--BOUNDARY--
+"""
+
+
+def make_dsn(recipient, token, action='failed', status='5.1.1'):
+    """ Return a delivery status notification for a bounced message. """
+
+    return email.message_from_string(DSN % {
+        'recipient': recipient,
+        'token': token,
+        'action': action,
+        'status': status,
+        'header': BOUNCE_HEADER
+    })
+
+
+class BounceTestCase(NewsletterTestMixin, TestCase):
+    """ Test case for processing bounces. """
+
+    def setUp(self):
+        super(BounceTestCase, self).setUp()
+
+        self.newsletter = self.make_newsletter()
+        self.subscriptions = self.make_subscriptions(self.newsletter, 3)
+
+    def make_dsn(self, subscription, **kwargs):
+        return make_dsn(
+            subscription.email, subscription.get_bounce_token(), **kwargs
+        )
+
+    def test_parse(self):
+        """ Permanent failures are parsed from notifications. """
+
+        subscription = self.subscriptions[0]
+
+        self.assertEqual(
+            parse_bounce(self.make_dsn(subscription)),
+            (subscription.get_bounce_token(), ['test0@example.org'])
+        )
+
+        self.assertEqual(
+            parse_bounce(self.make_dsn(subscription, action='delayed',
+                                       status='4.4.1')),
+            (subscription.get_bounce_token(), [])
+        )
+
+        self.assertIsNone(parse_bounce(email.message_from_string(
+            'Subject: Out of office\n\nBack next week.'
+        )))
+
+    def test_process(self):
+        """ Bounces are counted and frequent bouncers suppressed. """
+
+        processor = BounceProcessor(threshold=2)
+
+        for subscription in self.subscriptions:
+            processor.process(self.make_dsn(subscription))
+
+        processor.process(self.make_dsn(self.subscriptions[0]))
+        processor.process(make_dsn('unknown@test.com', '1-invalid'))
+
+        # Subscriptions bouncing equally often are updated at once; the
+        # other queries look up, check and add suppressions in a savepoint.
+        with self.assertNumQueries(7):
+            processor.flush()
+
+        self.assertEqual(
+            [s.bounce_count for s in Subscription.objects.order_by('pk')],
+            [2, 1, 1]
+        )
+        self.assertEqual(
+            list(Suppression.objects.values_list('email', 'reason')),
+            [('test0@example.org', Suppression.REASON_BOUNCE)]
+        )
+        self.assertEqual(processor.stats['bounces'], 4)
+        self.assertEqual(processor.stats['unmatched'], 1)
+        self.assertEqual(processor.stats['suppressed'], 1)
+
+    def test_batches(self):
+        """ Pending bounces are saved per batch. """
+
+        processor = BounceProcessor(batch_size=2)
+
+        processor.process(self.make_dsn(self.subscriptions[0]))
+        self.assertEqual(len(processor.pending), 1)
+
+        processor.process(self.make_dsn(self.subscriptions[1]))
+        self.assertEqual(len(processor.pending), 0)
+
+        self.assertEqual(
+            Subscription.objects.filter(bounce_count=1).count(), 2
+        )
@@ -0,0 +1,178 @@
+import email
+import io
+import json
+import mailbox
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from newsletter.export import iter_subscriptions
+from newsletter.models import Newsletter, Subscription, Suppression
+
+from .test_bounces import make_dsn
+from .utils import NewsletterTestMixin
+
+
+class ExportSubscribersTestCase(NewsletterTestMixin, TestCase):
+    """ Test case for the export_subscribers management command. """
+
+    def setUp(self):
+        super(ExportSubscribersTestCase, self).setUp()
+
+        self.newsletter = self.make_newsletter()
+
+        Subscription.objects.bulk_create([
+            Subscription(
+                newsletter=self.newsletter,
+                email_field='test%d@example.org' % index,
+                subscribed=bool(index % 2)
+            ) for index in range(5)
+        ])
+
+    def test_export(self):
+        """ Only active subscriptions are exported by default. """
+        out = StringIO()
+        call_command('export_subscribers', stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith(',test1@example.org,'))
+
+        out = StringIO()
+        call_command(
+            'export_subscribers', newsletter='test-newsletter', all=True,
+            format='jsonl', stdout=out
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+    def test_export_output(self):
+        """ Exports are written to a file as UTF-8. """
+        Subscription.objects.create(
+            newsletter=self.newsletter, name_field=u'Jos\xe9',
+            email_field='jose@example.org', subscribed=True
+        )
+
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+
+        output = os.path.join(tempdir, 'subscribers.jsonl')
+        call_command('export_subscribers', format='jsonl', output=output)
+
+        with io.open(output, encoding='utf-8') as fh:
+            entries = [json.loads(line) for line in fh]
+
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[-1]['name'], u'Jos\xe9')
+
+    def test_export_unknown_newsletter(self):
+        with self.assertRaises(CommandError):
+            call_command('export_subscribers', newsletter='nonexistent')
+
+    def test_iter_subscriptions_chunks(self):
+        """ Chunked iteration yields every subscription once, in order. """
+        queryset = Subscription.objects.all()
+
+        with self.assertNumQueries(3):
+            emails = [
+                s.email for s in iter_subscriptions(queryset, chunk_size=2)
+            ]
+
+        self.assertEqual(
+            emails, ['test%d@example.org' % index for index in range(5)]
+        )
+
+
+class ReconcileSubscriptionCountsTestCase(NewsletterTestMixin, TestCase):
+    """ Test case for the reconcile_subscription_counts command. """
+
+    def test_reconcile(self):
+        newsletter = self.make_newsletter()
+        Subscription.objects.bulk_create([
+            Subscription(
+                newsletter=newsletter, subscribed=True,
+                email_field='test%d@example.org' % index,
+            ) for index in range(3)
+        ])
+
+        out = StringIO()
+        call_command('reconcile_subscription_counts', stdout=out)
+
+        self.assertEqual(
+            out.getvalue(),
+            'Corrected counts for test-newsletter: subscribed_count +3\n'
+        )
+        self.assertEqual(
+            Newsletter.objects.get(pk=newsletter.pk).subscribed_count, 3
+        )
+
+        out = StringIO()
+        call_command('reconcile_subscription_counts', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+
+class ProcessBouncesTestCase(NewsletterTestMixin, TestCase):
+    """ Test case for the process_bounces management command. """
+
+    def setUp(self):
+        super(ProcessBouncesTestCase, self).setUp()
+
+        self.subscription, = self.make_subscriptions(
+            self.make_newsletter(), 1
+        )
+
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def make_mailbox(self):
+        """ Return a mbox with a bounce and a regular message. """
+
+        path = os.path.join(self.tempdir, 'bounces')
+
+        box = mailbox.mbox(path)
+        box.add(make_dsn(
+            self.subscription.email, self.subscription.get_bounce_token()
+        ))
+        box.add(email.message_from_string('Subject: Hello\n\nHi there!'))
+        box.close()
+
+        return path
+
+    def test_mbox(self):
+        """ Bounces in a mbox are counted, other messages left alone. """
+
+        path = self.make_mailbox()
+
+        out = StringIO()
+        call_command(
+            'process_bounces', path, threshold=1, delete=True, stdout=out
+        )
+
+        self.assertEqual(
+            out.getvalue().strip(),
+            'Processed 1 bounces, 0 unmatched; suppressed 1 addresses.'
+        )
+
+        subscription = Subscription.objects.get(pk=self.subscription.pk)
+        self.assertEqual(subscription.bounce_count, 1)
+        self.assertTrue(
+            Suppression.objects.filter(email='test0@example.org').exists()
+        )
+
+        # Only the bounce has been removed
+        box = mailbox.mbox(path)
+        self.assertEqual(
+            [message['Subject'] for message in box], ['Hello']
+        )
+        box.close()
+
+    def test_nonexistent(self):
+        """ Missing mailboxes are reported. """
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'process_bounces', os.path.join(self.tempdir, 'nonexistent')
+            )
@@ -1,24 +1,51 @@
 import itertools
 import six
 import unittest
+import warnings
 
+from contextlib import contextmanager
 from datetime import timedelta
+from smtplib import SMTPException
 
+from django.contrib.auth import get_user_model
 from django.core import mail
 
-from django.test.utils import patch_logger
+from django.test.utils import override_settings, patch_logger
 from django.utils.six.moves import range
 from django.utils.timezone import now
 
+from newsletter import models
 from newsletter.models import (
-    Newsletter, Subscription, Submission, Message, Article, get_default_sites
+    ActivationEmail, Newsletter, Subscription, Submission, Message, Article,
+    get_default_sites, Suppression, SuppressionList
 )
 from newsletter.utils import ACTIONS
 
-from .utils import MailTestCase, UserTestCase, template_exists
+from .utils import (
+    MailTestCase, NewsletterTestMixin, UserTestCase, template_exists
+)
+
+
+@contextmanager
+def patch_select_template():
+    """ Record the calls to select_template() by the newsletter models. """
+
+    calls = []
+
+    def recording_select_template(template_names):
+        calls.append(template_names)
+        return original(template_names)
 
+    original = models.select_template
+    models.select_template = recording_select_template
 
-class MailingTestCase(MailTestCase):
+    try:
+        yield calls
+    finally:
+        models.select_template = original
+
+
+class MailingTestCase(NewsletterTestMixin, MailTestCase):
 
     def get_newsletter_kwargs(self):
         """ Returns the keyword arguments for instanciating the newsletter. """
@@ -31,6 +58,8 @@ class MailingTestCase(MailTestCase):
         }
 
     def setUp(self):
+        super(MailingTestCase, self).setUp()
+
         self.n = Newsletter(**self.get_newsletter_kwargs())
         self.n.save()
         self.n.site = get_default_sites()
@@ -115,7 +144,10 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        self.assertEqual(sub.recipients, Submission.RECIPIENTS_ALL)
+        self.assertFalse(sub.subscriptions.exists())
+
+        subscriptions = sub.get_recipients()
         self.assertEqual(list(subscriptions), [self.s])
 
         self.assertFalse(sub.prepared)
@@ -130,7 +162,7 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        subscriptions = sub.get_recipients()
         self.assertEqual(list(subscriptions), [])
 
     def test_submission_unsubscribed(self):
@@ -141,7 +173,7 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        subscriptions = sub.get_recipients()
         self.assertEqual(list(subscriptions), [])
 
     def test_submission_unsubscribed_unactivated(self):
@@ -153,7 +185,7 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        subscriptions = sub.get_recipients()
         self.assertEqual(list(subscriptions), [])
 
     def test_twosubmissions(self):
@@ -167,7 +199,7 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        subscriptions = sub.get_recipients()
         self.assertTrue(self.s in list(subscriptions))
         self.assertTrue(s2 in list(subscriptions))
 
@@ -182,9 +214,31 @@ class CreateSubmissionTestCase(MailingTestCase):
 
         sub = Submission.from_message(self.m)
 
-        subscriptions = sub.subscriptions.all()
+        subscriptions = sub.get_recipients()
         self.assertEqual(list(subscriptions), [self.s])
 
+    def test_submission_recipients(self):
+        """ Recipients are limited to a segment or selected ones. """
+
+        user = get_user_model().objects.create_user(
+            'john', 'john@example.org', 'secret'
+        )
+        s2 = Subscription.objects.create(
+            user=user, newsletter=self.n, subscribed=True
+        )
+
+        sub = Submission.from_message(self.m)
+
+        sub.recipients = Submission.RECIPIENTS_USERS
+        self.assertEqual(list(sub.get_recipients()), [s2])
+
+        sub.recipients = Submission.RECIPIENTS_ANONYMOUS
+        self.assertEqual(list(sub.get_recipients()), [self.s])
+
+        sub.recipients = Submission.RECIPIENTS_SELECTED
+        sub.subscriptions = [s2]
+        self.assertEqual(list(sub.get_recipients()), [s2])
+
 
 class SubmitSubmissionTestCase(MailingTestCase):
     def setUp(self):
@@ -213,8 +267,8 @@ class SubmitSubmissionTestCase(MailingTestCase):
     def test_submitsubmission(self):
         """ Test queue-based submission. """
 
-        # Adding a subscription after the submission has been created, it should
-        # not be used when submitting self.sub
+        # Recipients are looked up when submitting, so subscriptions added
+        # after the submission has been created receive the message as well
         new_subscr = Subscription.objects.create(
             name='Other Name', email='other@test.com',
             newsletter=self.n, subscribed=True
@@ -233,15 +287,128 @@ class SubmitSubmissionTestCase(MailingTestCase):
         self.assertFalse(submission.sending)
 
         # Make sure mail is being sent out
-        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].to, [new_subscr.get_recipient()])
 
         # Make sure a submission contains the title and unsubscribe URL
         self.assertEmailContains(submission.message.title)
         self.assertEmailContains(submission.newsletter.unsubscribe_url())
         self.assertEmailHasHeader(
             'List-Unsubscribe',
+            '<https://example.com%s>' % self.s.one_click_unsubscribe_url(),
+            email=mail.outbox[0]
+        )
+        self.assertEmailHasHeader(
+            'List-Unsubscribe-Post', 'List-Unsubscribe=One-Click'
+        )
+        self.assertEmailHasHeader(
+            'X-Newsletter-Subscription', self.s.get_bounce_token(),
+            email=mail.outbox[0]
+        )
+
+    def test_extra_headers_deprecated(self):
+        """ The recipient independent headers are still available. """
+
+        with warnings.catch_warnings(record=True) as messages:
+            warnings.simplefilter('always')
+
+            headers = self.sub.extra_headers
+
+        self.assertEqual(headers, {
+            'List-Unsubscribe':
+                'http://example.com/newsletter/test-newsletter/unsubscribe/'
+        })
+        self.assertEqual(messages[0].category, DeprecationWarning)
+
+    def test_render_context(self):
+        """ Recipient independent data is looked up once per submission. """
+
+        for index in range(5):
+            Subscription.objects.create(
+                name='Name %d' % index, email='test%d@test.com' % index,
+                newsletter=self.n, subscribed=True
+            )
+
+        self.sub.publish_date = now() - timedelta(seconds=1)
+
+        context = self.sub.render_context
+
+        self.assertEqual(
+            context['unsubscribe_url'],
             'http://example.com/newsletter/test-newsletter/unsubscribe/'
         )
+        self.assertEqual(
+            context['archive_url'],
+            'http://example.com%s' % self.sub.get_absolute_url()
+        )
+        self.assertEqual(context['sender'], self.n.get_sender())
+
+        # Only the archive URL depends on whether the submission is published
+        self.sub.publish = False
+        del self.sub.render_context
+        self.assertIsNone(self.sub.render_context['archive_url'])
+
+        self.sub.submit()
+
+        self.assertEqual(len(mail.outbox), 6)
+
+        for message in mail.outbox:
+            self.assertIn(context['unsubscribe_url'], message.body)
+
+
+class SuppressionTestCase(MailingTestCase):
+    def setUp(self):
+        super(SuppressionTestCase, self).setUp()
+
+        Suppression.objects.create(email='Bounced@Example.com')
+
+    def test_submission(self):
+        """ Suppressed addresses are skipped when submitting. """
+
+        Subscription.objects.create(
+            name='Bounced', email='bounced@example.com',
+            newsletter=self.n, subscribed=True
+        )
+
+        sub = Submission.from_message(self.m)
+        sub.prepared = True
+        sub.publish_date = now() - timedelta(seconds=1)
+        sub.save()
+
+        Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.s.get_recipient()])
+        self.assertTrue(Submission.objects.get(pk=sub.pk).sent)
+
+    def test_set(self):
+        """ Small suppression lists are looked up in a set. """
+
+        suppressions = SuppressionList()
+        self.assertTrue(suppressions.exact)
+
+        with self.assertNumQueries(0):
+            suppressed = suppressions.get_suppressed(
+                ['BOUNCED@example.com', 'test@test.com']
+            )
+
+        self.assertEqual(suppressed, set(['bounced@example.com']))
+
+    def test_bloom_filter(self):
+        """ Addresses found in the Bloom filter are confirmed. """
+
+        suppressions = SuppressionList(limit=0)
+        self.assertFalse(suppressions.exact)
+
+        # Pretend the filter contains an address which isn't suppressed
+        suppressions.emails.add('test@test.com')
+
+        with self.assertNumQueries(1):
+            suppressed = suppressions.get_suppressed(
+                ['bounced@example.com', 'test@test.com']
+            )
+
+        self.assertEqual(suppressed, set(['bounced@example.com']))
 
 
 class SubscriptionTestCase(UserTestCase, MailingTestCase):
@@ -295,6 +462,200 @@ class SubscriptionTestCase(UserTestCase, MailingTestCase):
                 self.assertNotEqual(s.subscribe_date, old_subscribe_date)
 
 
+class SubscriptionCountsTestCase(MailingTestCase):
+    """ Test maintenance of the subscription counters of newsletters. """
+
+    def assertCounts(self, subscribed, unsubscribed, unactivated):
+        newsletter = Newsletter.objects.get(pk=self.n.pk)
+
+        self.assertEqual(
+            (newsletter.subscribed_count, newsletter.unsubscribed_count,
+             newsletter.unactivated_count),
+            (subscribed, unsubscribed, unactivated)
+        )
+
+        # Counters should match the actual subscriptions
+        self.assertFalse(newsletter.update_subscription_counts())
+
+    def test_state_transitions(self):
+        self.assertCounts(1, 0, 0)
+
+        s2 = Subscription.objects.create(
+            name='Test Name 2', email='test2@test.com', newsletter=self.n
+        )
+        self.assertCounts(1, 0, 1)
+
+        s2.update('subscribe')
+        self.assertCounts(2, 0, 0)
+
+        self.s.update('unsubscribe')
+        self.assertCounts(1, 1, 0)
+
+        # Saving without state changes leaves counters alone
+        self.s.save()
+        self.assertCounts(1, 1, 0)
+
+        s2.delete()
+        self.assertCounts(0, 1, 0)
+
+        Subscription.objects.all().delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_update_subscription_counts(self):
+        """ Drift from bulk operations is corrected by recounting. """
+
+        Subscription.objects.filter(pk=self.s.pk).update(subscribed=False)
+
+        self.assertTrue(self.n.update_subscription_counts())
+        self.assertEqual(self.n.subscribed_count, 0)
+        self.assertEqual(self.n.unactivated_count, 1)
+
+        self.assertFalse(self.n.update_subscription_counts())
+
+    def test_save_stale_newsletter(self):
+        """ Saving a newsletter with stale counters keeps the counts. """
+
+        newsletter = Newsletter.objects.get(pk=self.n.pk)
+
+        Subscription.objects.create(
+            name='Test Name 2', email='test2@test.com', newsletter=self.n,
+            subscribed=True
+        )
+
+        newsletter.title = 'Renamed newsletter'
+        newsletter.save()
+
+        self.assertEqual(
+            Newsletter.objects.get(pk=self.n.pk).title, 'Renamed newsletter'
+        )
+        self.assertCounts(2, 0, 0)
+
+
+class ActivationEmailTestCase(MailingTestCase):
+    """ Test sending queued activation emails. """
+
+    def test_send_queue(self):
+        """ Queued emails are sent in batches and removed from the queue. """
+
+        for action in ACTIONS:
+            ActivationEmail.objects.create(subscription=self.s, action=action)
+
+        ActivationEmail.send_queue(batch_size=2)
+
+        self.assertEqual(len(mail.outbox), len(ACTIONS))
+        self.assertFalse(ActivationEmail.objects.exists())
+
+    def test_send_queue_failure(self):
+        """ Failing emails stay queued until the maximum of attempts. """
+
+        email = ActivationEmail.objects.create(
+            subscription=self.s, action='subscribe'
+        )
+
+        def send_activation_email(subscription, action, connection=None):
+            raise SMTPException('Relay unavailable.')
+
+        original = Subscription.send_activation_email
+        Subscription.send_activation_email = send_activation_email
+
+        try:
+            with patch_logger('newsletter.models', 'error') as messages:
+                ActivationEmail.send_queue(max_attempts=2)
+                ActivationEmail.send_queue(max_attempts=2)
+                ActivationEmail.send_queue(max_attempts=2)
+        finally:
+            Subscription.send_activation_email = original
+
+        self.assertEqual(len(messages), 2)
+
+        email = ActivationEmail.objects.get(pk=email.pk)
+        self.assertEqual(email.attempts, 2)
+
+    def test_send_queue_error(self):
+        """ Any error sending an email counts as an attempt. """
+
+        email = ActivationEmail.objects.create(
+            subscription=self.s, action='subscribe'
+        )
+
+        def send_activation_email(subscription, action, connection=None):
+            raise ValueError('Invalid template.')
+
+        original = Subscription.send_activation_email
+        Subscription.send_activation_email = send_activation_email
+
+        try:
+            with patch_logger('newsletter.models', 'error') as messages:
+                ActivationEmail.send_queue()
+        finally:
+            Subscription.send_activation_email = original
+
+        self.assertEqual(len(messages), 1)
+
+        email = ActivationEmail.objects.get(pk=email.pk)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNone(email.claim_date)
+
+    def test_send_queue_claimed(self):
+        """ Emails claimed by another process are not sent again. """
+
+        email = ActivationEmail.objects.create(
+            subscription=self.s, action='subscribe'
+        )
+
+        self.assertTrue(email.claim())
+        self.assertFalse(email.claim())
+
+        ActivationEmail.send_queue()
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Claims of processes which didn't finish sending expire
+        ActivationEmail.objects.filter(pk=email.pk).update(
+            claim_date=now() - models.ACTIVATION_EMAIL_CLAIM_TIMEOUT
+        )
+
+        ActivationEmail.send_queue()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(ActivationEmail.objects.exists())
+
+
+class TemplatesCacheTestCase(MailingTestCase):
+    """ Test caching of resolved e-mail templates. """
+
+    def test_cached(self):
+        """ Templates are resolved once per newsletter and action. """
+
+        templates = self.n.get_templates('subscribe')
+
+        with patch_select_template() as calls:
+            self.assertEqual(self.n.get_templates('subscribe'), templates)
+            self.m.newsletter.get_templates('subscribe')
+
+        self.assertEqual(calls, [])
+
+    @override_settings(DEBUG=True)
+    def test_debug(self):
+        """ Templates are always resolved in DEBUG mode. """
+
+        self.n.get_templates('subscribe')
+
+        with patch_select_template() as calls:
+            self.n.get_templates('subscribe')
+
+        self.assertTrue(calls)
+
+    def test_newsletter_saved(self):
+        """ Saving a newsletter clears the cache. """
+
+        self.n.get_templates('subscribe')
+        self.n.save()
+
+        with patch_select_template() as calls:
+            self.n.get_templates('subscribe')
+
+        self.assertTrue(calls)
+
+
 class AllEmailsTestsMixin(object):
     """ Mixin for testing properties of sent e-mails for all message types. """
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import codecs
+import io
+
+from django import forms
+from django.test import TestCase
+
+from newsletter.addressimport.parsers import get_encoding, parse_jsonl
+
+from .utils import NewsletterTestMixin
+
+
+class GetEncodingTestCase(TestCase):
+    """ Test case for the encoding detection of address files. """
+
+    def test_utf8(self):
+        """ UTF-8 is detected without consulting chardet. """
+        myfile = io.BytesIO(
+            u'name;email\nJosé;jose@example.org\n'.encode('utf-8')
+        )
+
+        self.assertEqual(get_encoding(myfile), 'utf-8')
+        self.assertEqual(myfile.tell(), 0)
+
+    def test_bom(self):
+        """ Byte order marks determine the encoding. """
+        myfile = io.BytesIO(codecs.BOM_UTF8 + b'name;email\n')
+        self.assertEqual(get_encoding(myfile), 'utf-8-sig')
+
+        myfile = io.BytesIO(u'name;email\n'.encode('utf-16'))
+        self.assertEqual(get_encoding(myfile), 'utf-16')
+
+    def test_truncated_sample(self):
+        """ A multibyte character cut off by the sample is still UTF-8. """
+        data = u'name;email\nJosé;jose@example.org\n'.encode('utf-8')
+        cutoff = data.index(u'é'.encode('utf-8')) + 1
+
+        myfile = io.BytesIO(data)
+        self.assertEqual(get_encoding(myfile, sample_size=cutoff), 'utf-8')
+
+    def test_fallback(self):
+        """ Other encodings are detected from the sample by chardet. """
+        data = u'name;email\n' + u'Jérôme Müller;jerome@example.org\n' * 50
+        myfile = io.BytesIO(data.encode('latin-1'))
+
+        encoding = get_encoding(myfile, sample_size=1024)
+
+        self.assertNotEqual(encoding, 'utf-8')
+        self.assertEqual(myfile.tell(), 0)
+
+
+class ParseJsonlTestCase(NewsletterTestMixin, TestCase):
+    """ Test case for the JSON Lines parser. """
+
+    def setUp(self):
+        super(ParseJsonlTestCase, self).setUp()
+
+        self.newsletter = self.make_newsletter()
+
+        self.data = (
+            b'{"name": "John Smith", "email": "john@example.org"}\n'
+            b'not json\n'
+            b'{"e-mail": "jill@example.org"}\n'
+        )
+
+    def test_invalid_line(self):
+        """ Invalid lines yield a validation error. """
+        with self.assertRaises(forms.ValidationError):
+            parse_jsonl(io.BytesIO(self.data), self.newsletter)
+
+    def test_ignore_errors(self):
+        """ Invalid lines are skipped when ignoring errors. """
+        addresses = parse_jsonl(
+            io.BytesIO(self.data), self.newsletter, ignore_errors=True
+        )
+
+        self.assertEqual(addresses, {
+            'john@example.org': 'John Smith',
+            'jill@example.org': '',
+        })
+
+    def test_invalid_types(self):
+        """ Members which are no strings are reported as malformed. """
+        data = (
+            b'{"email": 42}\n'
+            b'{"email": "john@example.org", "name": ["John"]}\n'
+            b'[1, 2]\n'
+            b'{"email": "jill@example.org"}\n'
+        )
+
+        with self.assertRaises(forms.ValidationError):
+            parse_jsonl(io.BytesIO(data), self.newsletter)
+
+        addresses = parse_jsonl(
+            io.BytesIO(data), self.newsletter, ignore_errors=True
+        )
+
+        self.assertEqual(addresses, {'jill@example.org': ''})
+        self.assertEqual(addresses.errors['malformed'], 3)
+
+    def test_bom(self):
+        """ A byte order mark at the start of the file is skipped. """
+        addresses = parse_jsonl(
+            io.BytesIO(codecs.BOM_UTF8 + self.data), self.newsletter,
+            ignore_errors=True
+        )
+
+        self.assertIn('john@example.org', addresses)
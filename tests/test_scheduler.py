@@ -0,0 +1,289 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core import mail
+from django.core.management import call_command
+from django.test.utils import patch_logger
+from django.utils.six import StringIO
+from django.utils.timezone import now
+
+import newsletter.scheduler
+from newsletter.models import Submission, Subscription
+from newsletter.scheduler import SubmissionScheduler
+
+from .test_mailing import MailingTestCase
+
+
+@contextmanager
+def record_messages(fail_after=None):
+    """
+    Record the submission of every message sent. Sending fails for the
+    submissions in `fail_after` once they have sent the given number of
+    messages.
+    """
+
+    sent = []
+    fail_after = fail_after or {}
+
+    def recording_send_message(submission, subscription):
+        if sent.count(submission.pk) == fail_after.get(submission.pk):
+            raise RuntimeError('Template error.')
+
+        sent.append(submission.pk)
+        return original(submission, subscription)
+
+    original = Submission.send_message
+    Submission.send_message = recording_send_message
+
+    try:
+        yield sent
+    finally:
+        Submission.send_message = original
+
+
+class SubmissionSchedulerTestCase(MailingTestCase):
+    """ Test case for the in-process submission scheduler. """
+
+    def setUp(self):
+        super(SubmissionSchedulerTestCase, self).setUp()
+
+        self.scheduler = SubmissionScheduler()
+
+    def make_submission(self, publish_date):
+        submission = Submission.from_message(self.m)
+        submission.prepared = True
+        submission.publish_date = publish_date
+        submission.save()
+
+        return submission
+
+    def test_pop_due(self):
+        """ Only submissions due are popped, in order of publication. """
+
+        later = self.make_submission(now() - timedelta(seconds=1))
+        earlier = self.make_submission(now() - timedelta(minutes=1))
+        future = self.make_submission(now() + timedelta(hours=1))
+
+        self.scheduler.sync()
+
+        self.assertEqual(self.scheduler.pop_due(), [earlier.pk, later.pk])
+        self.assertEqual(self.scheduler.queue, [
+            (future.publish_date, future.pk)
+        ])
+
+    def test_timeout(self):
+        """ The scheduler sleeps until the next submission is due. """
+
+        self.make_submission(now() + timedelta(seconds=2))
+        self.scheduler.sync()
+
+        self.assertTrue(0 < self.scheduler.get_timeout() <= 2)
+
+        self.scheduler.queue = []
+        self.assertEqual(
+            self.scheduler.get_timeout(), self.scheduler.poll_interval
+        )
+
+    def test_sync(self):
+        """ Saving submissions triggers reloading the queue. """
+
+        self.scheduler.sync()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.scheduler.needs_sync())
+
+        submission = self.make_submission(now() - timedelta(seconds=1))
+        self.assertTrue(self.scheduler.needs_sync())
+
+        self.assertEqual(self.scheduler.run_pending(), 1)
+
+        submission = Submission.objects.get(pk=submission.pk)
+        self.assertTrue(submission.sent)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claimed(self):
+        """ Submissions claimed elsewhere are not sent again. """
+
+        submission = self.make_submission(now() - timedelta(seconds=1))
+        self.scheduler.sync()
+
+        self.assertTrue(submission.claim())
+        self.assertFalse(submission.claim())
+
+        self.assertEqual(self.scheduler.run_pending(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command(self):
+        """ The worker command sends due submissions. """
+
+        self.make_submission(now() - timedelta(seconds=1))
+        self.make_submission(now() + timedelta(hours=1))
+
+        out = StringIO()
+        call_command('submission_worker', once=True, stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), 'Sent 1 submissions.')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_interleaving(self):
+        """ Batches of submissions being sent at once are interleaved. """
+
+        large = self.make_submission(now() - timedelta(minutes=1))
+        small = self.make_submission(now() - timedelta(seconds=1))
+
+        subscriptions = [self.s] + [
+            Subscription.objects.create(
+                name='Test Name', email='test%d@test.com' % n,
+                newsletter=self.n, subscribed=True
+            ) for n in range(3)
+        ]
+
+        for submission, selected in ((large, subscriptions),
+                                     (small, subscriptions[:2])):
+            submission.recipients = Submission.RECIPIENTS_SELECTED
+            submission.save()
+            submission.subscriptions = selected
+
+        scheduler = SubmissionScheduler(batch_size=1)
+
+        with record_messages() as sent:
+            self.assertEqual(scheduler.run_pending(), 2)
+
+        self.assertEqual(sent, [
+            large.pk, small.pk, large.pk, small.pk, large.pk, large.pk
+        ])
+
+    def test_failure(self):
+        """ Failing submissions are dropped, others are still sent. """
+
+        failing = self.make_submission(now() - timedelta(minutes=1))
+        other = self.make_submission(now() - timedelta(seconds=1))
+
+        with record_messages(fail_after={failing.pk: 0}) as sent:
+            with patch_logger('newsletter.scheduler', 'error') as messages:
+                self.assertEqual(self.scheduler.run_pending(), 1)
+
+        self.assertEqual(sent, [other.pk])
+        self.assertEqual(len(messages), 1)
+
+        failing = Submission.objects.get(pk=failing.pk)
+        self.assertFalse(failing.sent)
+        self.assertFalse(failing.sending)
+
+        self.assertTrue(Submission.objects.get(pk=other.pk).sent)
+
+        # Failed submissions are not retried by the same scheduler
+        self.assertEqual(self.scheduler.run_pending(), 0)
+
+    def test_run_error(self):
+        """ The worker keeps running after errors. """
+
+        calls = []
+
+        def run_pending():
+            calls.append(None)
+
+            if len(calls) == 1:
+                raise RuntimeError('Database unavailable.')
+
+            raise KeyboardInterrupt
+
+        def close_old_connections():
+            closed.append(len(calls))
+
+        closed = []
+
+        self.scheduler.run_pending = run_pending
+        self.scheduler.get_timeout = lambda: 0
+
+        original = newsletter.scheduler.close_old_connections
+        newsletter.scheduler.close_old_connections = close_old_connections
+
+        try:
+            with patch_logger('newsletter.scheduler', 'error') as messages:
+                with self.assertRaises(KeyboardInterrupt):
+                    self.scheduler.run()
+        finally:
+            newsletter.scheduler.close_old_connections = original
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(messages), 1)
+
+        # Connections are checked before every run and after errors
+        self.assertEqual(closed, [0, 1, 1])
+
+    def test_interleaving_failure(self):
+        """ Interleaving goes on when one of the submissions fails. """
+
+        large = self.make_submission(now() - timedelta(minutes=3))
+        failing = self.make_submission(now() - timedelta(minutes=2))
+        small = self.make_submission(now() - timedelta(minutes=1))
+
+        subscriptions = [self.s] + [
+            Subscription.objects.create(
+                name='Test Name', email='test%d@test.com' % n,
+                newsletter=self.n, subscribed=True
+            ) for n in range(3)
+        ]
+
+        for submission, selected in ((large, subscriptions),
+                                     (failing, subscriptions),
+                                     (small, subscriptions[:2])):
+            submission.recipients = Submission.RECIPIENTS_SELECTED
+            submission.save()
+            submission.subscriptions = selected
+
+        scheduler = SubmissionScheduler(batch_size=1)
+
+        with record_messages(fail_after={failing.pk: 1}) as sent:
+            with patch_logger('newsletter.scheduler', 'error'):
+                self.assertEqual(scheduler.run_pending(), 2)
+
+        self.assertEqual(sent, [
+            large.pk, failing.pk, small.pk, large.pk, small.pk,
+            large.pk, large.pk
+        ])
+        self.assertFalse(Submission.objects.get(pk=failing.pk).sending)
+
+    def test_priority(self):
+        """ Submissions with a higher priority get more batches. """
+
+        low = self.make_submission(now() - timedelta(minutes=1))
+        low.priority = Submission.PRIORITY_LOW
+        low.save()
+
+        high = self.make_submission(now() - timedelta(seconds=1))
+        high.priority = Submission.PRIORITY_HIGH
+        high.save()
+
+        for n in range(4):
+            Subscription.objects.create(
+                name='Test Name', email='test%d@test.com' % n,
+                newsletter=self.n, subscribed=True
+            )
+
+        scheduler = SubmissionScheduler(batch_size=1)
+
+        with record_messages() as sent:
+            self.assertEqual(scheduler.run_pending(), 2)
+
+        # Both start at the same pass, after which the high priority
+        # submission sends all of its batches first.
+        self.assertEqual(
+            sent, [high.pk, low.pk] + [high.pk] * 4 + [low.pk] * 4
+        )
+
+    def test_submit_batches(self):
+        """ Submissions are sent in batches of limited size. """
+
+        submission = self.make_submission(now() - timedelta(seconds=1))
+
+        for n in range(4):
+            Subscription.objects.create(
+                name='Test Name', email='test%d@test.com' % n,
+                newsletter=self.n, subscribed=True
+            )
+
+        self.assertEqual(list(submission.submit_batches(2)), [2, 2, 1])
+        self.assertTrue(submission.sent)
+        self.assertEqual(len(mail.outbox), 5)
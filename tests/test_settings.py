@@ -101,3 +101,34 @@ class SettingsTestCase(TestCase):
         Test whether e-mail confirmation overrides come through.
         """
         self.assertFalse(newsletter_settings.CONFIRM_EMAIL_UPDATE)
+
+    def test_resolved_once(self):
+        """ Resolved settings are stored on the settings object. """
+
+        newsletter_settings.CONFIRM_EMAIL_UPDATE
+
+        self.assertIn('CONFIRM_EMAIL_UPDATE', newsletter_settings.__dict__)
+
+    def test_setting_changed(self):
+        """ Changing settings clears resolved settings. """
+
+        self.assertIsNone(newsletter_settings.CACHE_CONTROL)
+
+        with self.settings(NEWSLETTER_CACHE_CONTROL={'max_age': 60}):
+            self.assertEqual(
+                newsletter_settings.CACHE_CONTROL, {'max_age': 60}
+            )
+
+        self.assertIsNone(newsletter_settings.CACHE_CONTROL)
+
+    @unittest.skipIf(
+        hasattr(settings, 'NEWSLETTER_CONFIRM_EMAIL_UPDATE'),
+        'Confirmation e-mail defaults overridden by Django settings.'
+    )
+    def test_dependent_setting_changed(self):
+        """ Defaults depending on changed settings are resolved again. """
+
+        self.assertTrue(newsletter_settings.CONFIRM_EMAIL_UPDATE)
+
+        with self.settings(NEWSLETTER_CONFIRM_EMAIL=False):
+            self.assertFalse(newsletter_settings.CONFIRM_EMAIL_UPDATE)
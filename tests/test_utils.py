@@ -0,0 +1,117 @@
+from django.core.urlresolvers import reverse, set_script_prefix
+from django.test import TestCase
+from django.utils.http import urlquote
+
+from newsletter.utils import (
+    BloomFilter, URLTemplate, make_activation_code, make_activation_codes
+)
+
+
+class URLTemplateTestCase(TestCase):
+    """ Test case for URL templates. """
+
+    def setUp(self):
+        self.url_template = URLTemplate(
+            'newsletter_update_activate',
+            ('newsletter_slug', 'email', 'activation_code'),
+            action='subscribe'
+        )
+
+    def assertURLsEqual(self, **kwargs):
+        self.assertEqual(
+            self.url_template(**kwargs),
+            reverse(
+                'newsletter_update_activate',
+                kwargs=dict(kwargs, action='subscribe')
+            )
+        )
+
+    def test_reverse(self):
+        """ URL's are equal to those from reverse(). """
+
+        self.assertURLsEqual(
+            newsletter_slug='test-newsletter',
+            email='test@example.com',
+            activation_code='ab12cd'
+        )
+
+    def test_quoting(self):
+        """ Values are quoted like reverse() does. """
+
+        self.assertURLsEqual(
+            newsletter_slug='test_newsletter',
+            email='test.name+tag~x@example.com',
+            activation_code='ab12cd'
+        )
+
+    def test_quote(self):
+        """ Quoting is equivalent to urlquote() with reverse()'s safe set. """
+
+        for value in (u'plain', u'caf\xe9 au lait', u'50%', u'a/b:c@d'):
+            self.assertEqual(
+                self.url_template.quote(value),
+                urlquote(value, safe=URLTemplate.safe)
+            )
+
+    def test_script_prefix(self):
+        """ URL's follow changes of the script prefix. """
+
+        try:
+            set_script_prefix('/pre%20fix/')
+
+            self.assertURLsEqual(
+                newsletter_slug='test-newsletter',
+                email='test@example.com',
+                activation_code='ab12cd'
+            )
+        finally:
+            set_script_prefix('/')
+
+
+class ActivationCodeTestCase(TestCase):
+    """ Test case for activation code generation. """
+
+    def assertActivationCode(self, code):
+        self.assertEqual(len(code), 40)
+        int(code, 16)
+
+    def test_activation_code(self):
+        """ Activation codes are random 40 character hex strings. """
+
+        code = make_activation_code()
+
+        self.assertActivationCode(code)
+        self.assertNotEqual(code, make_activation_code())
+
+    def test_activation_codes(self):
+        """ Codes generated in bulk are valid and unique. """
+
+        codes = make_activation_codes(100)
+
+        self.assertEqual(len(codes), 100)
+        self.assertEqual(len(set(codes)), 100)
+
+        for code in codes:
+            self.assertActivationCode(code)
+
+        self.assertEqual(make_activation_codes(0), [])
+
+
+class BloomFilterTestCase(TestCase):
+    """ Test case for Bloom filters. """
+
+    def test_membership(self):
+        """ Added values are always found, others mostly not. """
+
+        bloom = BloomFilter(1000, error_rate=0.01)
+
+        for n in range(1000):
+            bloom.add(u'user%d@example.com' % n)
+
+        for n in range(1000):
+            self.assertIn(u'user%d@example.com' % n, bloom)
+
+        false_positives = sum(
+            u'other%d@example.com' % n in bloom for n in range(10000)
+        )
+        self.assertLess(false_positives, 300)
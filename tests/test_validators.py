@@ -2,10 +2,12 @@ from django.test import TestCase
 from django.forms.utils import ValidationError
 from django.contrib.auth import get_user_model
 
-from newsletter.validators import validate_email_nouser
+from newsletter.validators import get_user_emails, validate_email_nouser
 
+from .utils import NewsletterTestMixin
 
-class ValidatorTestCase(TestCase):
+
+class ValidatorTestCase(NewsletterTestMixin, TestCase):
     """ Test case for validators. """
 
     def test_validate_email_nouser_noerror(self):
@@ -22,3 +24,56 @@ class ValidatorTestCase(TestCase):
 
         with self.assertRaises(ValidationError):
             validate_email_nouser(user.email)
+
+    def test_validate_email_nouser_cache(self):
+        """ Addresses not belonging to a user are cached until saved. """
+        validate_email_nouser('lennon@thebeatles.com')
+
+        with self.assertNumQueries(0):
+            validate_email_nouser('lennon@thebeatles.com')
+
+        User = get_user_model()
+        User.objects.create_user('john', 'lennon@thebeatles.com')
+
+        with self.assertRaises(ValidationError):
+            validate_email_nouser('lennon@thebeatles.com')
+
+    def test_validate_email_nouser_cache_changed(self):
+        """ Users changing their address invalidate the cached address. """
+        User = get_user_model()
+        user = User.objects.create_user('john', 'john@example.com')
+
+        validate_email_nouser('lennon@thebeatles.com')
+
+        user.email = 'lennon@thebeatles.com'
+        user.save()
+
+        with self.assertRaises(ValidationError):
+            validate_email_nouser('lennon@thebeatles.com')
+
+        validate_email_nouser('john@example.com')
+
+        # Changing the address of a user loaded from the database
+        user = User.objects.get(pk=user.pk)
+        user.email = 'john@example.com'
+        user.save()
+
+        with self.assertRaises(ValidationError):
+            validate_email_nouser('john@example.com')
+
+    def test_get_user_emails(self):
+        """ Addresses are checked against users in chunks. """
+        User = get_user_model()
+        User.objects.create_user('john', 'lennon@thebeatles.com')
+        User.objects.create_user('paul', 'mccartney@thebeatles.com')
+
+        emails = ['user%d@example.com' % n for n in range(10)]
+        emails += ['lennon@thebeatles.com', 'mccartney@thebeatles.com']
+
+        with self.assertNumQueries(3):
+            user_emails = get_user_emails(emails, chunk_size=5)
+
+        self.assertEqual(
+            user_emails,
+            set(['lennon@thebeatles.com', 'mccartney@thebeatles.com'])
+        )
@@ -2,6 +2,7 @@
 # Get the with statement from the future
 from __future__ import with_statement
 
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import time
@@ -17,36 +18,91 @@ except ImportError:
 from django.contrib.auth import get_user_model
 
 from django.core import mail
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
 from django.utils import timezone
 from django.utils.encoding import force_text
 
-from django.test.utils import override_settings, patch_logger
+from django.db import connection
+from django.test.utils import (
+    override_settings, patch_logger, CaptureQueriesContext
+)
 
+from newsletter import utils
 from newsletter.models import (
-    Newsletter, Subscription, Submission, Message, get_default_sites
+    ActivationEmail, Article, Newsletter, Subscription, Submission, Message,
+    get_default_sites
 )
 
 from newsletter.forms import UpdateForm
 
-from .utils import MailTestCase, UserTestCase, WebTestCase, ComparingTestCase
+from .utils import (
+    MailTestCase, NewsletterTestMixin, UserTestCase, WebTestCase,
+    ComparingTestCase
+)
 
 
 # Amount of seconds to wait to test time comparisons in submissions.
 WAIT_TIME = 1
 
 
-class NewsletterListTestCase(WebTestCase):
+class FrozenTime(object):
+    """ Stand-in for the time module, returning a settable timestamp. """
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+    def time(self):
+        return self.timestamp
+
+
+@contextmanager
+def freeze_time(timestamp):
+    """ Have the newsletter utilities see `timestamp` as the time. """
+
+    frozen = FrozenTime(timestamp)
+
+    original = utils.time
+    utils.time = frozen
+
+    try:
+        yield frozen
+    finally:
+        utils.time = original
+
+
+class NewsletterListTestCase(NewsletterTestMixin, WebTestCase):
     """ Base class for newsletter test cases. """
 
     fixtures = ['test_newsletters']
 
     def setUp(self):
+        super(NewsletterListTestCase, self).setUp()
+
         self.newsletters = Newsletter.objects.all()
 
         self.list_url = reverse('newsletter_list')
 
+    def assertConditional(self, url, change):
+        """
+        Assert requests for `url` are answered with a 304 when revalidating
+        its ETag, until `change` is called.
+        """
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
 
 class AnonymousNewsletterListTestCase(NewsletterListTestCase):
     """ Test case for anonymous views of newsletter. """
@@ -78,6 +134,27 @@ class AnonymousNewsletterListTestCase(NewsletterListTestCase):
         for n in self.newsletters.filter(visible=False):
             self.assertNotContains(response, n.title)
 
+    def test_list_cached(self):
+        """ Visible newsletters are cached until a newsletter changes. """
+
+        self.client.get(self.list_url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+
+        newsletter = self.newsletters.filter(visible=True)[0]
+        newsletter.title = 'Renamed newsletter'
+        newsletter.save()
+
+        self.assertContains(self.client.get(self.list_url), newsletter.title)
+
+        newsletter.site.clear()
+
+        self.assertNotContains(
+            self.client.get(self.list_url), newsletter.title
+        )
+
     def test_detail(self):
         for n in self.newsletters:
 
@@ -145,6 +222,43 @@ class AnonymousNewsletterListTestCase(NewsletterListTestCase):
             response = self.client.get(archive_url)
             self.assertContains(response, n.title, status_code=200)
 
+    def test_list_conditional(self):
+        """ The list supports conditional requests by anonymous users. """
+
+        def change():
+            newsletter = self.newsletters.filter(visible=True)[0]
+            newsletter.title = 'Changed title'
+            newsletter.save()
+
+        self.assertConditional(self.list_url, change)
+
+    def test_detail_conditional(self):
+        """ Newsletter details support conditional requests. """
+
+        n = self.newsletters.filter(visible=True)[0]
+
+        detail_url = reverse(
+            'newsletter_detail',
+            kwargs={'newsletter_slug': n.slug}
+        )
+
+        def change():
+            n.sender = 'Changed sender'
+            n.save()
+
+        self.assertConditional(detail_url, change)
+
+    @override_settings(
+        NEWSLETTER_CACHE_CONTROL={'public': True, 'max_age': 300}
+    )
+    def test_cache_control(self):
+        """ Cache-Control directives are set as configured. """
+
+        response = self.client.get(self.list_url)
+
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+
     def test_detail_invisible_not_found(self):
         """
         Test whether an invisible newsletter causes a 404 in detail view.
@@ -208,6 +322,56 @@ class UserNewsletterListTestCase(UserTestCase,
             self.assertContains(response, form['id'])
             self.assertContains(response, form['subscribed'])
 
+    def test_listform_subscriptions(self):
+        """ Missing subscriptions are created as unactivated ones. """
+
+        Subscription.objects.all().delete()
+        Newsletter.objects.update(unactivated_count=0)
+
+        self.client.get(self.list_url)
+
+        for newsletter in self.newsletters.filter(visible=True):
+            subscription = self.get_user_subscription(newsletter)
+            self.assertFalse(subscription.subscribed)
+            self.assertFalse(subscription.unsubscribed)
+
+            self.assertEqual(newsletter.unactivated_count, 1)
+
+        # Subsequent requests reuse the existing subscriptions
+        self.client.get(self.list_url)
+
+        for newsletter in self.newsletters.filter(visible=True):
+            self.get_user_subscription(newsletter)
+
+    def test_listform_queries(self):
+        """
+        The number of queries for the list doesn't depend on the number of
+        newsletters, both with and without existing subscriptions.
+        """
+
+        def add_newsletters(count):
+            for index in range(count):
+                slug = 'newsletter-%d' % Newsletter.objects.count()
+                newsletter = Newsletter.objects.create(
+                    title=slug, slug=slug, sender='Test Sender',
+                    email='test@testsender.com'
+                )
+                newsletter.site = get_default_sites()
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.list_url)
+            self.assertEqual(response.status_code, 200)
+
+            return len(queries)
+
+        add_newsletters(1)
+        few_creating, few_existing = count_queries(), count_queries()
+
+        add_newsletters(10)
+        self.assertEqual(count_queries(), few_creating)
+        self.assertEqual(count_queries(), few_existing)
+
     def test_update(self):
         """ Attempt to subscribe a user to newsletters. """
 
@@ -249,6 +413,23 @@ class UserNewsletterListTestCase(UserTestCase,
             self.newsletters.filter(visible=True).count()
         )
 
+    def test_list_not_conditional(self):
+        """ Lists with a formset for the user are not validated. """
+
+        response = self.client.get(self.list_url)
+
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_detail_not_conditional(self):
+        """ Newsletter details for logged in users are not validated. """
+
+        newsletter = self.newsletters.filter(visible=True)[0]
+
+        response = self.client.get(newsletter.get_absolute_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
     def test_invalid_update(self):
         """ Test an invalid update, which should fail. """
         # Make sure no subscriptions exist on beforehand
@@ -568,6 +749,119 @@ class AnonymousSubscribeTestCase(
 
         self.assertEmailContains(full_activate_url)
 
+    @override_settings(NEWSLETTER_ACTIVATION_EMAIL_OUTBOX=True)
+    def test_subscribe_request_post_outbox(self):
+        """ Activation emails are queued when the outbox is enabled. """
+
+        response = self.client.post(
+            self.subscribe_url, {
+                'name_field': 'Test Name',
+                'email_field': 'test@email.com'
+            }
+        )
+
+        self.assertRedirects(response, self.subscribe_email_sent_url)
+
+        subscription = self.get_only_subscription(
+            email_field__exact='test@email.com'
+        )
+
+        # Nothing is sent until the outbox is processed
+        self.assertEqual(len(mail.outbox), 0)
+
+        queued = ActivationEmail.objects.get()
+        self.assertEqual(queued.subscription, subscription)
+        self.assertEqual(queued.action, 'subscribe')
+
+        ActivationEmail.send_queue()
+
+        self.assertFalse(ActivationEmail.objects.exists())
+        self.assertEqual(len(mail.outbox), 1)
+
+        activate_url = subscription.subscribe_activate_url()
+        full_activate_url = 'http://%s%s' % (self.site.domain, activate_url)
+
+        self.assertEmailContains(full_activate_url)
+
+    @override_settings(NEWSLETTER_THROTTLE_IP_RATE=(2, 60))
+    def test_subscribe_request_throttle_ip(self):
+        """ Requests from a single IP address are throttled. """
+
+        cache.clear()
+
+        # 45 seconds into a window
+        with freeze_time(6000045):
+            for count in range(3):
+                with patch_logger('newsletter.views', 'warning') as messages:
+                    response = self.client.post(
+                        self.subscribe_url, {
+                            'name_field': 'Test Name',
+                            'email_field': 'test%d@email.com' % count
+                        }
+                    )
+
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '15')
+            self.assertEqual(len(messages), 1)
+
+            self.assertEqual(
+                Subscription.objects.filter(newsletter=self.n).count(), 2
+            )
+
+            # Other IP addresses are not affected
+            response = self.client.post(
+                self.subscribe_url, {
+                    'name_field': 'Test Name',
+                    'email_field': 'test@email.com'
+                }, REMOTE_ADDR='127.0.0.2'
+            )
+            self.assertRedirects(response, self.subscribe_email_sent_url)
+
+    @override_settings(NEWSLETTER_THROTTLE_EMAIL_RATE=(1, 60))
+    def test_subscribe_request_throttle_email(self):
+        """ Requests for a single e-mail address are throttled. """
+
+        cache.clear()
+
+        data = {
+            'name_field': 'Test Name',
+            'email_field': 'test@email.com'
+        }
+
+        with freeze_time(6000000) as frozen:
+            response = self.client.post(self.subscribe_url, data)
+            self.assertRedirects(response, self.subscribe_email_sent_url)
+
+            data['email_field'] = 'TEST@email.com'
+
+            frozen.timestamp += 59
+
+            with patch_logger('newsletter.views', 'warning'):
+                response = self.client.post(
+                    self.subscribe_url, data, REMOTE_ADDR='127.0.0.2'
+                )
+
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(len(mail.outbox), 1)
+
+            # Throttled requests are rejected without querying the database
+            with patch_logger('newsletter.views', 'warning'):
+                with self.assertNumQueries(0):
+                    response = self.client.post(
+                        self.subscribe_url, data, REMOTE_ADDR='127.0.0.2'
+                    )
+
+            self.assertEqual(response.status_code, 429)
+
+            # Requests are allowed again in the next window
+            frozen.timestamp += 1
+
+            response = self.client.post(
+                self.subscribe_url, data, REMOTE_ADDR='127.0.0.2'
+            )
+            self.assertRedirects(response, self.subscribe_email_sent_url)
+
     @override_settings(NEWSLETTER_CONFIRM_EMAIL_SUBSCRIBE=True)
     def test_subscribe_request_post_emptyemail(self):
         """ Post the subscription form without email shoud fail. """
@@ -1223,6 +1517,8 @@ class ArchiveTestcase(NewsletterListTestCase):
     def setUp(self):
         """ Make sure we have a few submissions to test with. """
 
+        super(ArchiveTestcase, self).setUp()
+
         # Pick some newsletter
         try:
             self.newsletter = Newsletter.objects.all()[0]
@@ -1271,6 +1567,20 @@ class ArchiveTestcase(NewsletterListTestCase):
         self.assertContains(response, self.submission.message.title)
         self.assertContains(response, self.submission.get_absolute_url())
 
+    def test_archive_list_conditional(self):
+        """ The archive supports conditional requests. """
+
+        archive_url = self.submission.newsletter.archive_url()
+
+        response = self.client.get(archive_url)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        def change():
+            self.submission.publish = False
+            self.submission.save()
+
+        self.assertConditional(archive_url, change)
+
     def test_archive_detail(self):
         """ Test Submission detail view. """
 
@@ -1281,6 +1591,67 @@ class ArchiveTestcase(NewsletterListTestCase):
 
         self.assertContains(response, self.submission.message.title)
 
+    def test_archive_detail_cache(self):
+        """ Renderings are cached until the message or an article changes. """
+
+        detail_url = self.submission.get_absolute_url()
+        message = self.submission.message
+
+        article = Article(
+            post=message, title='Test article', text='Original text'
+        )
+        article.save()
+
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'Original text')
+
+        # Changes bypassing the models are not visible
+        Article.objects.filter(pk=article.pk).update(text='Sneaky text')
+
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'Original text')
+
+        # Saving an article invalidates the cache
+        article.text = 'Updated text'
+        article.save()
+
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'Updated text')
+
+        # As does deleting it
+        article.delete()
+
+        response = self.client.get(detail_url)
+        self.assertNotContains(response, 'Updated text')
+
+    def test_archive_detail_conditional(self):
+        """ Conditional requests for unchanged messages yield a 304. """
+
+        detail_url = self.submission.get_absolute_url()
+
+        response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            detail_url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Modifying the message changes the ETag
+        Article(
+            post=self.submission.message, title='Test article', text='Text'
+        ).save()
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
     def test_archive_unpublished_detail(self):
         """ Assert that an unpublished submission is truly inaccessible. """
 
@@ -1329,6 +1700,97 @@ class ArchiveTestcase(NewsletterListTestCase):
         self.test_archive_detail()
 
 
+class OneClickUnsubscribeTestCase(NewsletterTestMixin, WebTestCase,
+                                  MailTestCase):
+    """ Test unsubscribing through signed one-click links. """
+
+    def setUp(self):
+        super(OneClickUnsubscribeTestCase, self).setUp()
+
+        self.n = self.make_newsletter()
+        self.s, = self.make_subscriptions(self.n, 1)
+
+        self.url = self.s.one_click_unsubscribe_url()
+
+        # Mail clients don't have CSRF tokens
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+    def test_get(self):
+        """ GET requests render a form, without unsubscribing. """
+
+        response = self.client.get(self.url)
+
+        self.assertContains(response, self.n.title)
+        self.assertContains(response, '<form method="post"')
+
+        self.assertTrue(Subscription.objects.get(pk=self.s.pk).subscribed)
+
+    def test_post(self):
+        """ POST requests unsubscribe, without sending email. """
+
+        response = self.client.post(
+            self.url, {'List-Unsubscribe': 'One-Click'}
+        )
+
+        self.assertContains(response, 'successfully been unsubscribed')
+        self.assertContains(
+            response, '<title>Newsletter %s unsubscribe</title>' % self.n.title
+        )
+
+        subscription = Subscription.objects.get(pk=self.s.pk)
+        self.assertFalse(subscription.subscribed)
+        self.assertTrue(subscription.unsubscribed)
+        self.assertTrue(subscription.unsubscribe_date)
+
+        self.assertEqual(len(mail.outbox), 0)
+
+        newsletter = Newsletter.objects.get(pk=self.n.pk)
+        self.assertEqual(newsletter.subscribed_count, 0)
+        self.assertEqual(newsletter.unsubscribed_count, 1)
+
+        # Repeated requests don't affect the counters
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        newsletter = Newsletter.objects.get(pk=self.n.pk)
+        self.assertEqual(newsletter.unsubscribed_count, 1)
+
+    def test_invalid_token(self):
+        """ Tampered tokens are rejected. """
+
+        token = self.s.get_unsubscribe_token()
+        subscription_id, signature = token.split('-')
+
+        for invalid_token in (
+                '%d-%s' % (self.s.pk + 1, signature),
+                '%s-%s' % (subscription_id, signature[::-1]),
+                subscription_id, 'x-%s' % signature):
+
+            url = reverse('newsletter_unsubscribe_one_click', kwargs={
+                'newsletter_slug': self.n.slug, 'token': invalid_token
+            })
+
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 404)
+
+        self.assertTrue(Subscription.objects.get(pk=self.s.pk).subscribed)
+
+    def test_other_newsletter(self):
+        """ Tokens are only valid for the newsletter subscribed to. """
+
+        other = self.make_newsletter(slug='other-newsletter', visible=False)
+
+        url = reverse('newsletter_unsubscribe_one_click', kwargs={
+            'newsletter_slug': other.slug,
+            'token': self.s.get_unsubscribe_token()
+        })
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.assertTrue(Subscription.objects.get(pk=self.s.pk).subscribed)
+
+
 class ActionTemplateViewMixin(object):
     """ Mixin for testing requests to urls for all three actions. """
 
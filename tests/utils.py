@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 
 from django.core import mail
+from django.core.cache import cache
 from django.core.mail.backends.base import BaseEmailBackend
 
 from django.test import TestCase
@@ -16,6 +17,55 @@ from django.template import loader, TemplateDoesNotExist
 
 from django_webtest import WebTest
 
+from newsletter.models import (
+    Newsletter, Subscription, clear_templates_cache, get_default_sites
+)
+from newsletter.settings import newsletter_settings
+
+
+def clear_caches():
+    """
+    Forget everything cached by the newsletter app, so cached data of one
+    test doesn't leak into another.
+    """
+    cache.clear()
+    clear_templates_cache()
+    newsletter_settings.clear()
+
+
+class NewsletterTestMixin(object):
+    """ Fresh caches and factories for newsletters and subscriptions. """
+
+    def setUp(self):
+        super(NewsletterTestMixin, self).setUp()
+
+        clear_caches()
+
+    def make_newsletter(self, **kwargs):
+        defaults = {
+            'title': 'Test newsletter',
+            'slug': 'test-newsletter',
+            'sender': 'Test Sender',
+            'email': 'test@test.com'
+        }
+        defaults.update(kwargs)
+
+        newsletter = Newsletter.objects.create(**defaults)
+        newsletter.site = get_default_sites()
+
+        return newsletter
+
+    def make_subscriptions(self, newsletter, count, **kwargs):
+        """ Create `count` subscriptions to test<n>@example.org. """
+        kwargs.setdefault('subscribed', True)
+
+        return [
+            Subscription.objects.create(
+                newsletter=newsletter, email_field='test%d@example.org' % n,
+                **kwargs
+            ) for n in range(count)
+        ]
+
 
 class WebTestCase(WebTest):
     def setUp(self):